@@ -2,15 +2,20 @@ import streamlit as st
 import os
 import pandas as pd
 from dotenv import load_dotenv
-from models.rag_manager import RAGManager
-from models.grok_engine import GrokEngine
-from models.gemini_engine import GeminiEngine
+from models.hedging import HedgedEngine
+from models.resources import get_engine, get_hedged_engine, get_pipeline, get_rag_manager, is_rag_manager_loaded
 from utils.helpers import extract_json, format_prompt_for_display
-from utils.evaluation import evaluate_models
+from utils.eval_store import EvalRunStore
+from utils.evaluation import evaluate_models, load_run
+from utils.metrics import metrics, start_metrics_server
 
 # Load environment variables
 load_dotenv()
 
+# Optional Prometheus endpoint (http://127.0.0.1:<METRICS_PORT>/metrics); started once per process
+if os.getenv("METRICS_PORT"):
+    start_metrics_server(int(os.getenv("METRICS_PORT")))
+
 # Page Config
 st.set_page_config(
     page_title="StableGen Assistant",
@@ -22,13 +27,16 @@ st.set_page_config(
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
-if "rag_manager" not in st.session_state:
-    with st.spinner("Veritabanı başlatılıyor..."):
-        try:
-            st.session_state.rag_manager = RAGManager()
-        except Exception as e:
-            st.error(f"RAG Modülü başlatılamadı: {e}")
-            st.session_state.rag_manager = None
+# RAG manager is shared process-wide (one embedding model / Chroma client for all sessions)
+rag_manager = None
+try:
+    if is_rag_manager_loaded():
+        rag_manager = get_rag_manager()
+    else:
+        with st.spinner("Veritabanı başlatılıyor..."):
+            rag_manager = get_rag_manager()
+except Exception as e:
+    st.error(f"RAG Modülü başlatılamadı: {e}")
 
 # Sidebar Configuration
 with st.sidebar:
@@ -43,11 +51,24 @@ with st.sidebar:
     
     st.info("API anahtarları .env dosyasından veya buradan girilebilir.")
 
+    use_cache = st.checkbox("Yanıt önbelleğini kullan", value=True, help="Aynı istek ve bağlam için önceki model cevabını diskten getirir; çok benzer istekler (semantik önbellek) de önceki JSON cevabını kullanır.")
+    use_intent_classifier = st.checkbox(
+        "Yerel niyet sınıflandırıcı", value=True,
+        help="Selamlaşma ve kapsam dışı mesajlar LLM'e gönderilmeden yerel modelle hazır cevapla yanıtlanır."
+    )
+    use_hedging = st.checkbox(
+        "Hedged mod (iki modeli yarıştır)", value=False,
+        help="Seçili model p95 gecikmesi içinde cevap vermezse aynı istek diğer modele de gönderilir; ilk geçerli cevap kullanılır. İki API anahtarı gerekir."
+    )
+
     st.markdown("---")
     if st.button("Veritabanını Güncelle"):
-        if st.session_state.rag_manager:
+        if rag_manager:
             with st.spinner("Veritabanı güncelleniyor..."):
-                success = st.session_state.rag_manager.refresh_db()
+                refresh_progress = st.progress(0.0)
+                success = rag_manager.refresh_db(
+                    progress_callback=lambda done, total: refresh_progress.progress(min(done / total, 1.0)) if total else None
+                )
                 if success:
                     st.success("Veritabanı başarıyla güncellendi!")
                 else:
@@ -94,38 +115,65 @@ with tab_chat:
 
         # Generate Response
         with st.chat_message("assistant"):
-            with st.spinner(f"{selected_model} ile cevap üretiliyor..."):
-                # 1. RAG Retrieval
-                context_examples = []
-                if st.session_state.rag_manager:
-                    context_examples = st.session_state.rag_manager.query_db(prompt)
-                    with st.expander("RAG Context (Bulunan Benzer Örnekler)"):
-                        for i, ex in enumerate(context_examples):
-                            st.text(f"Example {i+1}:\n{ex}")
-                
-                # 2. LLM Generation
+            # Retrieval -> LLM -> JSON extraction runs on the shared async pipeline
+            pipeline = get_pipeline(rag_manager, use_intent_classifier=use_intent_classifier)
+            try:
+                api_key = user_xai_key if selected_model == "xAI Grok-2" else user_google_key
+                if use_hedging and user_xai_key and user_google_key:
+                    # Selected model is the primary, the other one is the hedge
+                    other_model = "Google Gemini 2.0 Flash" if selected_model == "xAI Grok-2" else "xAI Grok-2"
+                    other_key = user_google_key if selected_model == "xAI Grok-2" else user_xai_key
+                    engine = get_hedged_engine(selected_model, api_key, other_model, other_key, use_cache=use_cache)
+                else:
+                    if use_hedging:
+                        st.warning("Hedged mod için iki API anahtarı da gerekli; yalnızca seçili model kullanılıyor.")
+                    engine = get_engine(selected_model, api_key, use_cache=use_cache)
+
+                stream_placeholder = st.empty()
+                stream_placeholder.caption("Benzer örnekler aranıyor...")
                 response_content = ""
-                try:
-                    if selected_model == "xAI Grok-2":
-                        engine = GrokEngine(api_key=user_xai_key)
-                        response_content = engine.generate_response(prompt, context_examples)
+                result = None
+                for event, payload in pipeline.iterate(pipeline.stream(prompt, engine, use_semantic_cache=use_cache)):
+                    if event == "context":
+                        # 1. RAG Retrieval
+                        stream_placeholder.empty()
+                        if rag_manager:
+                            with st.expander("RAG Context (Bulunan Benzer Örnekler)"):
+                                for i, ex in enumerate(payload):
+                                    st.text(f"Example {i+1}:\n{ex}")
+                        stream_placeholder = st.empty()
+                        stream_placeholder.caption(f"{selected_model} ile cevap üretiliyor...")
+                    elif event == "chunk":
+                        # 2. LLM Generation (tokens are rendered as they arrive)
+                        response_content += payload
+                        stream_placeholder.markdown(response_content + "▌")
                     else:
-                        engine = GeminiEngine(api_key=user_google_key)
-                        response_content = engine.generate_response(prompt, context_examples)
-                    
-                    # 3. Process Response (JSON vs Text)
-                    json_data = extract_json(response_content)
+                        result = payload
+                stream_placeholder.empty()
+                if result["local"]:
+                    st.caption(f"⚡ Yerel cevap (niyet: {result['intent']}), LLM çağrılmadı.")
+                elif result["semantic_match"]:
+                    cache_stats = pipeline.semantic_cache.stats()
+                    st.caption(f"♻️ Semantik önbellek: \"{result['semantic_match']}\" isteğinin cevabı kullanıldı, LLM çağrılmadı "
+                               f"(isabet oranı {cache_stats['hit_rate']:.0%}, {cache_stats['entries']} kayıt).")
+                elif isinstance(engine, HedgedEngine):
+                    stats = engine.stats
+                    st.caption(f"⚡ Hedged: {stats['hedged']}/{stats['requests']} istek hedge edildi "
+                               f"(gecikme eşiği {engine.current_delay():.2f}s)")
+                
+                # 3. Process Response (JSON vs Text)
+                json_data = result["json_data"]
+                
+                if json_data:
+                    st.success("JSON Prompt Oluşturuldu!")
+                    st.json(json_data)
+                    st.session_state.messages.append({"role": "assistant", "content": json_data, "is_json": True})
+                else:
+                    st.markdown(response_content)
+                    st.session_state.messages.append({"role": "assistant", "content": response_content, "is_json": False})
                     
-                    if json_data:
-                        st.success("JSON Prompt Oluşturuldu!")
-                        st.json(json_data)
-                        st.session_state.messages.append({"role": "assistant", "content": json_data, "is_json": True})
-                    else:
-                        st.markdown(response_content)
-                        st.session_state.messages.append({"role": "assistant", "content": response_content, "is_json": False})
-                        
-                except Exception as e:
-                    st.error(f"Hata oluştu: {str(e)}")
+            except Exception as e:
+                st.error(f"Hata oluştu: {str(e)}")
 
 # --- TAB 2: PERFORMANCE ANALYSIS ---
 with tab_perf:
@@ -134,25 +182,56 @@ with tab_perf:
     
     st.info("Bu test, örnek sorular kullanarak modellerin 'JSON Üretme' ve 'Açıklama Yapma' niyetlerini ne kadar doğru ayırt ettiğini ölçer.")
 
+    # Retrieval for the whole test set runs once (batched, cached on disk) and is replayed for both models
+    eval_with_rag = st.checkbox(
+        "RAG bağlamıyla test et",
+        value=rag_manager is not None,
+        disabled=rag_manager is None,
+        help="Açıkken modeller sohbet ekranındaki gibi RAG örnekleriyle test edilir; kapalıyken zero-shot."
+    )
+
     if st.button("🚀 Testi Başlat", type="primary"):
         progress_bar = st.progress(0)
         
         with st.spinner("Modeller test ediliyor... (Bu işlem biraz zaman alabilir)"):
-            # Run Evaluation
-            results_df, responses_log, test_data_used = evaluate_models(
+            # Run Evaluation (resumes the last unfinished run with the same setup; every answer is persisted)
+            results_df, responses_log, test_data_used, run_id = evaluate_models(
                 user_xai_key, 
                 user_google_key, 
-                progress_callback=lambda p: progress_bar.progress(p)
+                progress_callback=lambda p: progress_bar.progress(p),
+                use_cache=use_cache,
+                rag_manager=rag_manager if eval_with_rag else None
             )
         
         progress_bar.progress(100)
-        st.success("Test Tamamlandı!")
+        st.success(f"Test Tamamlandı! (Koşu: {run_id})")
         
         # Save results AND response logs to session state
         st.session_state.test_results = results_df
         st.session_state.test_logs = responses_log
         st.session_state.test_data_used = test_data_used
 
+    # Earlier runs are reloaded from the run store; no API calls
+    with st.expander("🗂️ Kayıtlı test koşuları"):
+        past_runs = EvalRunStore().list_runs()
+        if not past_runs:
+            st.caption("Henüz kayıtlı koşu yok.")
+        else:
+            run_labels = {
+                run["run_id"]: (
+                    f"{run['run_id']} — {'tamamlandı' if run['finished_at'] else 'yarım kaldı'}, "
+                    f"{run['answered']} yanıt, {'RAG' if run['config'].get('rag') else 'Zero-Shot'}"
+                )
+                for run in past_runs
+            }
+            selected_run = st.selectbox("Koşu", list(run_labels), format_func=run_labels.get)
+            if st.button("📂 Koşuyu Yükle"):
+                loaded = load_run(selected_run)
+                if loaded:
+                    st.session_state.test_results, st.session_state.test_logs, st.session_state.test_data_used = loaded
+                    st.success(f"Koşu {selected_run} yüklendi.")
+            st.caption("Yarım kalan bir koşu, aynı ayarlarla \"Testi Başlat\"a basıldığında kaldığı yerden devam eder.")
+
     if "test_results" in st.session_state:
         results_df = st.session_state.test_results
         
@@ -224,3 +303,31 @@ with tab_perf:
                     st.write(resp)
         else:
             st.warning("Detaylı inceleme için önce testi başlatın.")
+
+    # Live latency panel from the in-process metrics (chat + evaluation requests of this server)
+    st.markdown("---")
+    if st.checkbox("⏱️ Gecikme panelini göster", value=False):
+        metric_rows = metrics.snapshot()
+        timer_rows = [row for row in metric_rows if row["metric"].endswith("_seconds") and row.get("p50") is not None]
+        if timer_rows:
+            latency_df = pd.DataFrame([
+                {
+                    "Aşama": f"{row['metric']} {row['labels']}".strip(),
+                    "Adet": row["count"],
+                    "p50 (ms)": round(row["p50"] * 1000, 2),
+                    "p95 (ms)": round(row["p95"] * 1000, 2),
+                    "p99 (ms)": round(row["p99"] * 1000, 2)
+                }
+                for row in timer_rows
+            ])
+            st.dataframe(latency_df, use_container_width=True)
+            st.caption("p95 Gecikme (ms)")
+            st.bar_chart(latency_df.set_index("Aşama")["p95 (ms)"], color="#FF9800")
+
+            other_rows = [row for row in metric_rows if row not in timer_rows]
+            if other_rows:
+                with st.expander("Sayaçlar ve boyutlar (byte / tahmini token)"):
+                    st.dataframe(pd.DataFrame(other_rows), use_container_width=True)
+            st.download_button("Prometheus formatında indir", metrics.to_prometheus(), file_name="stablegen_metrics.prom")
+        else:
+            st.info("Henüz ölçüm yok. Chat üzerinden birkaç istek gönderin veya testi başlatın.")
@@ -0,0 +1,196 @@
+"""
+Headless batch conversion of prompt ideas to Stable Diffusion JSON.
+
+    python batch_generate.py ideas.csv -o results.jsonl --model grok --concurrency 8
+    python batch_generate.py ideas.xlsx -o results.jsonl --resume          # continue an interrupted run
+    python batch_generate.py ideas.jsonl -o results.jsonl --resume --retry-failed   # also redo failed rows
+
+Input: CSV / JSONL / XLSX with a `user_input` (or `text`) column.
+Output: one JSON line per input row, appended as soon as the row finishes:
+    {"row": 12, "user_input": "...", "status": "json" | "text" | "failed", "json": {...}, "response": "...", "error": "...", "elapsed": 1.23}
+The output file doubles as the checkpoint: with --resume, rows already present are skipped.
+With --retry-failed a row can appear more than once; its last line is the current result.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import time
+from dotenv import load_dotenv
+from models.pipeline import ChatPipeline
+from models.resources import get_engine, get_rag_manager
+from utils.concurrency import async_call_with_retry, is_error_response
+from utils.data_loader import iter_excel_chunks
+from utils.helpers import extract_json
+
+MODELS = {
+    "grok": ("xAI Grok-2", "XAI_API_KEY"),
+    "gemini": ("Google Gemini 2.0 Flash", "GOOGLE_API_KEY")
+}
+INPUT_COLUMNS = ("user_input", "text")
+
+
+def _pick_column(columns, column):
+    if column:
+        return column
+    for candidate in INPUT_COLUMNS:
+        if candidate in columns:
+            return candidate
+    raise ValueError(f"Girdi dosyasında {INPUT_COLUMNS} kolonlarından biri bulunamadı (--column ile belirtin).")
+
+
+def iter_inputs(path, column=None):
+    """Yields (row_index, user_input) from a CSV, JSONL or XLSX file without loading it all."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            reader = csv.DictReader(f)
+            key = _pick_column(reader.fieldnames or [], column)
+            for i, row in enumerate(reader):
+                yield i, row.get(key) or ""
+    elif ext in (".jsonl", ".ndjson"):
+        with open(path, "r", encoding="utf-8") as f:
+            key = None
+            i = 0
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    record = None
+                if isinstance(record, str):
+                    yield i, record
+                elif isinstance(record, dict):
+                    key = key or _pick_column(record.keys(), column)
+                    yield i, str(record.get(key) or "")
+                else:
+                    # Not JSON, or a number / list / null: skipped, but keeps its row index so
+                    # fixing the line later does not shift the rows after it
+                    print(f"⚠️  {path}:{line_number} atlandı (metin ya da nesne olmayan JSON satırı).")
+                i += 1
+    elif ext in (".xlsx", ".xlsm"):
+        from openpyxl import load_workbook
+        wb = load_workbook(path, read_only=True)
+        try:
+            header = next(wb.active.iter_rows(max_row=1, values_only=True), ())
+        finally:
+            wb.close()
+        key = _pick_column([h for h in header if h], column)
+        i = 0
+        for chunk in iter_excel_chunks(path, [key]):
+            for value in chunk[key]:
+                yield i, value
+                i += 1
+    else:
+        raise ValueError(f"Desteklenmeyen dosya türü: {ext} (csv, jsonl, xlsx)")
+
+
+def load_checkpoint(output_path, retry_failed):
+    """Row indices already finished in a previous run (failed rows count only without --retry-failed)."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Partially written last line of a crashed run
+            if not isinstance(record, dict) or "row" not in record:
+                continue
+            if record.get("status") != "failed" or not retry_failed:
+                done.add(record["row"])
+    return done
+
+
+async def run_batch(args):
+    model_name, key_env = MODELS[args.model]
+    api_key = args.api_key or os.getenv(key_env)
+    if not api_key:
+        raise SystemExit(f"API anahtarı eksik: --api-key verin veya {key_env} ayarlayın.")
+
+    engine = get_engine(model_name, api_key, use_cache=not args.no_cache)
+    pipeline = ChatPipeline(None if args.no_rag else get_rag_manager())
+
+    done = load_checkpoint(args.output, args.retry_failed) if args.resume else set()
+    if not args.resume and os.path.exists(args.output):
+        raise SystemExit(f"{args.output} zaten var. Devam etmek için --resume kullanın.")
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    counts = {"json": 0, "text": 0, "failed": 0, "skipped": len(done)}
+    start_time = time.time()
+
+    with open(args.output, "a", encoding="utf-8") as out:
+
+        def write(record):
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            counts[record["status"]] += 1
+            finished = counts["json"] + counts["text"] + counts["failed"]
+            if finished % 50 == 0:
+                rate = finished / (time.time() - start_time)
+                print(f"   {finished} satır işlendi ({rate:.1f}/s) - json: {counts['json']}, text: {counts['text']}, failed: {counts['failed']}")
+
+        async def run_row(row, text, context_examples):
+            async with semaphore:
+                row_start = time.time()
+                record = {"row": row, "user_input": text}
+                try:
+                    response = await async_call_with_retry(
+                        engine.agenerate_response, text, context_examples, max_retries=args.retries
+                    )
+                    if is_error_response(response):
+                        record.update(status="failed", error=response)
+                    else:
+                        json_data = extract_json(response)
+                        record.update(status="json" if json_data else "text", json=json_data, response=response)
+                except Exception as e:
+                    record.update(status="failed", error=str(e))
+                record["elapsed"] = round(time.time() - row_start, 3)
+                write(record)
+
+        # Rows are processed in windows: one batched retrieval per window, bounded LLM concurrency inside it
+        window = []
+        for row, text in iter_inputs(args.input, args.column):
+            if row in done or not text.strip():
+                continue
+            window.append((row, text))
+            if len(window) >= args.window:
+                await _run_window(pipeline, window, run_row)
+                window = []
+        if window:
+            await _run_window(pipeline, window, run_row)
+
+    elapsed = time.time() - start_time
+    print(f"🏁 Bitti ({elapsed:.1f}s) - json: {counts['json']}, text: {counts['text']}, "
+          f"failed: {counts['failed']}, önceden tamamlanmış: {counts['skipped']}")
+
+
+async def _run_window(pipeline, window, run_row):
+    all_examples = await pipeline.retrieve_many([text for _, text in window])
+    await asyncio.gather(*(run_row(row, text, ex) for (row, text), ex in zip(window, all_examples)))
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Batch convert prompt ideas to Stable Diffusion JSON")
+    parser.add_argument("input", help="CSV, JSONL or XLSX file")
+    parser.add_argument("-o", "--output", required=True, help="Output JSONL (also the checkpoint)")
+    parser.add_argument("--model", choices=MODELS.keys(), default="grok")
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--column", default=None, help="Input column name (default: user_input or text)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Max in-flight LLM requests")
+    parser.add_argument("--window", type=int, default=256, help="Rows per batched retrieval window")
+    parser.add_argument("--retries", type=int, default=2, help="Retries per row (exponential backoff)")
+    parser.add_argument("--resume", action="store_true", help="Skip rows already in the output file")
+    parser.add_argument("--retry-failed", action="store_true", help="With --resume, redo rows that failed")
+    parser.add_argument("--no-rag", action="store_true", help="Do not add RAG examples")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache")
+    args = parser.parse_args()
+    asyncio.run(run_batch(args))
+
+
+if __name__ == "__main__":
+    main()
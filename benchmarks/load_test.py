@@ -0,0 +1,121 @@
+"""
+Offline load test of the full chat pipeline (RAG -> prompt build -> LLM -> extract_json)
+against the local mock LLM server, using the real GrokEngine/GeminiEngine HTTP clients.
+
+    python -m benchmarks.load_test --requests 500 --concurrency 16 --latency-ms 400 --error-rate 0.02
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.mock_llm_server import start_server
+from benchmarks.run_benchmarks import latency_summary
+from benchmarks.stubs import HashEmbeddingFunction
+from benchmarks.synthetic_data import generate_queries, write_excel
+from models.gemini_engine import GeminiEngine
+from models.grok_engine import GrokEngine
+from models.rag_manager import RAGManager
+from utils.concurrency import is_error_response
+from utils.helpers import extract_json
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test against the mock LLM server")
+    parser.add_argument("--model", choices=["grok", "gemini"], default="grok")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=1000, help="Synthetic RAG sheet size")
+    parser.add_argument("--stream", action="store_true", help="Use generate_response_stream")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--recordings", default=None)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.4)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default=None, help="Optional JSON output path")
+    args = parser.parse_args()
+
+    server = start_server(
+        port=args.port, recordings_path=args.recordings, latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, seed=args.seed
+    )
+    base = f"http://127.0.0.1:{args.port}"
+    if args.model == "grok":
+        # SDK retries would hide injected errors; the pipeline's own handling is what we measure
+        engine = GrokEngine("mock-key", use_cache=False, base_url=f"{base}/v1")
+        engine.client = engine.client.with_options(max_retries=0)
+    else:
+        engine = GeminiEngine("mock-key", use_cache=False, base_url=base)
+
+    workdir = tempfile.mkdtemp(prefix="stablegen_load_")
+    try:
+        excel_path = write_excel(os.path.join(workdir, "prompts.xlsx"), args.rows)
+        rag = RAGManager(
+            excel_path=excel_path,
+            db_path=os.path.join(workdir, "chroma", "db"),
+            test_data_path=os.path.join(workdir, "test_set.json"),
+            embedding_store_path=os.path.join(workdir, "embeddings"),
+            columnar_cache_dir=os.path.join(workdir, "columnar"),
+            embedding_function=HashEmbeddingFunction()
+        )
+        queries = (generate_queries(args.requests, seed=args.seed) * 2)[:args.requests]
+
+        def run_one(query):
+            timings = {}
+            start = time.perf_counter()
+            context = rag.query_db(query)
+            timings["retrieval"] = time.perf_counter() - start
+
+            llm_start = time.perf_counter()
+            if args.stream:
+                chunks = []
+                for chunk in engine.generate_response_stream(query, context):
+                    if not chunks:
+                        timings["first_token"] = time.perf_counter() - llm_start
+                    chunks.append(chunk)
+                response = "".join(chunks)
+            else:
+                response = engine.generate_response(query, context)
+            timings["llm"] = time.perf_counter() - llm_start
+
+            parse_start = time.perf_counter()
+            extract_json(response)
+            timings["parse"] = time.perf_counter() - parse_start
+            timings["total"] = time.perf_counter() - start
+            return timings, is_error_response(response)
+
+        wall_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            outcomes = list(executor.map(run_one, queries))
+        wall = time.perf_counter() - wall_start
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    stages = {}
+    for timings, _ in outcomes:
+        for stage, seconds in timings.items():
+            stages.setdefault(stage, []).append(seconds)
+
+    report = {
+        "config": vars(args),
+        "wall_seconds": round(wall, 3),
+        "throughput_per_s": round(len(queries) / wall, 2),
+        "errors": sum(1 for _, failed in outcomes if failed),
+        "stages": {stage: latency_summary(samples) for stage, samples in stages.items()},
+        "server": server.RequestHandlerClass.behavior.stats
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Local stand-in for the xAI (OpenAI-compatible) and Gemini REST APIs.
+
+Replays recorded responses (JSONL written with LLM_RECORD_PATH, lines of
+{"model", "input", "response"}) with configurable latency and error distributions,
+so the chat path and evaluate_models can be load-tested without network or quota.
+
+    python -m benchmarks.mock_llm_server --port 8765 --recordings recordings.jsonl \\
+        --latency-ms 400 --latency-sigma 0.5 --error-rate 0.02 --rate-limit-rate 0.01
+
+Point the engines at it with:
+    XAI_BASE_URL=http://127.0.0.1:8765/v1  GEMINI_BASE_URL=http://127.0.0.1:8765
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.stubs import StubEngine
+from models.prompt_builder import USER_INPUT_MARKER
+
+
+class ReplayBook:
+    """Recorded responses by user input; unknown inputs fall back to StubEngine's canned answers."""
+
+    def __init__(self, recordings_path=None):
+        self.responses = {}
+        self.fallback = StubEngine()
+        if recordings_path:
+            with open(recordings_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.responses.setdefault(record["input"], []).append(record["response"])
+
+    def lookup(self, user_input, rng):
+        recorded = self.responses.get(user_input)
+        if recorded:
+            return rng.choice(recorded)
+        return self.fallback.generate_response(user_input)
+
+
+class MockBehavior:
+    """Latency (log-normal around a median) and error injection, shared by all request threads."""
+
+    def __init__(self, latency_ms=300.0, latency_sigma=0.4, chunk_delay_ms=15.0, error_rate=0.0, rate_limit_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.chunk_delay_ms = chunk_delay_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0, "streams": 0}
+
+    def draw(self):
+        """Returns (status_code, latency_seconds) for one request."""
+        with self._lock:
+            self.stats["requests"] += 1
+            roll = self.rng.random()
+            latency = self.latency_ms * math.exp(self.rng.gauss(0, self.latency_sigma)) / 1000 if self.latency_ms else 0.0
+            if roll < self.rate_limit_rate:
+                self.stats["rate_limited"] += 1
+                return 429, 0.0
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.stats["errors"] += 1
+                return 500, latency
+            return 200, latency
+
+
+def _split_chunks(text, size=24):
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    book = None
+    behavior = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_sse(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+    def _send_event(self, data):
+        self.wfile.write(f"data: {data}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            with self.behavior._lock:
+                self._send_json(200, dict(self.behavior.stats))
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+
+        status, latency = self.behavior.draw()
+        if status != 200:
+            time.sleep(latency)
+            self._send_json(status, {"error": {"code": status, "message": "mock injected error", "status": "UNAVAILABLE"}})
+            return
+
+        if self.path.endswith("/chat/completions"):
+            self._handle_openai(body, latency)
+        elif ":generateContent" in self.path or ":streamGenerateContent" in self.path:
+            self._handle_gemini(body, latency)
+        else:
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+
+    def _handle_openai(self, body, latency):
+        user_messages = [m for m in body.get("messages", []) if m.get("role") == "user"]
+        user_input = user_messages[-1]["content"] if user_messages else ""
+        text = self.book.lookup(user_input, self.behavior.rng)
+        model = body.get("model", "mock")
+        created = int(time.time())
+
+        time.sleep(latency)
+        if not body.get("stream"):
+            self._send_json(200, {
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+            })
+            return
+
+        with self.behavior._lock:
+            self.behavior.stats["streams"] += 1
+        self._start_sse()
+        for piece in _split_chunks(text):
+            self._send_event(json.dumps({
+                "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+            }, ensure_ascii=False))
+            time.sleep(self.behavior.chunk_delay_ms / 1000)
+        self._send_event(json.dumps({
+            "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created, "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+        }))
+        self._send_event("[DONE]")
+
+    def _handle_gemini(self, body, latency):
+        prompt = ""
+        for content in body.get("contents", []):
+            for part in content.get("parts", []):
+                prompt += part.get("text", "")
+        # The engine puts the user input after a fixed marker at the end of the prompt
+        user_input = prompt.rsplit(USER_INPUT_MARKER.strip(), 1)[-1].strip()
+        text = self.book.lookup(user_input, self.behavior.rng)
+
+        def response(piece):
+            return {
+                "candidates": [{"content": {"parts": [{"text": piece}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+                "usageMetadata": {"promptTokenCount": 0, "candidatesTokenCount": 0, "totalTokenCount": 0},
+                "modelVersion": "mock"
+            }
+
+        time.sleep(latency)
+        if ":streamGenerateContent" not in self.path:
+            self._send_json(200, response(text))
+            return
+
+        with self.behavior._lock:
+            self.behavior.stats["streams"] += 1
+        self._start_sse()
+        for piece in _split_chunks(text):
+            self._send_event(json.dumps(response(piece), ensure_ascii=False))
+            time.sleep(self.behavior.chunk_delay_ms / 1000)
+
+
+def start_server(host="127.0.0.1", port=8765, recordings_path=None, **behavior_kwargs):
+    """Starts the mock server on a daemon thread and returns it (call .shutdown() to stop)."""
+    handler = type("BoundMockLLMHandler", (MockLLMHandler,), {
+        "book": ReplayBook(recordings_path),
+        "behavior": MockBehavior(**behavior_kwargs)
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock xAI/Gemini server for offline load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--recordings", default=None, help="JSONL recorded with LLM_RECORD_PATH")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Median response latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.4, help="Log-normal spread (tail heaviness)")
+    parser.add_argument("--chunk-delay-ms", type=float, default=15.0, help="Delay between streamed chunks")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction answered with HTTP 429")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server = start_server(
+        args.host, args.port, args.recordings,
+        latency_ms=args.latency_ms, latency_sigma=args.latency_sigma, chunk_delay_ms=args.chunk_delay_ms,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, seed=args.seed
+    )
+    print(f"Mock LLM server listening on http://{args.host}:{args.port}")
+    print(f"   XAI_BASE_URL=http://{args.host}:{args.port}/v1  GEMINI_BASE_URL=http://{args.host}:{args.port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
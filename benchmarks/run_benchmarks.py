@@ -0,0 +1,274 @@
+"""
+Offline benchmark suite for the ingestion, retrieval, prompt-building and JSON extraction hot paths.
+
+Usage (from the repo root):
+    python -m benchmarks.run_benchmarks --sizes 1000 10000 100000
+    python -m benchmarks.run_benchmarks --sizes 1000 --compare benchmarks/results/<previous>.json
+
+LLM APIs are replaced by StubEngine; embeddings use a hashing stub unless --embedding minilm is given.
+Results are written as JSON to benchmarks/results/ so runs can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmarks.stubs import HashEmbeddingFunction, StubEngine
+from benchmarks.synthetic_data import generate_queries, generate_rows, write_excel
+from models.embedding_store import LazyEmbeddingFunction
+from models.gemini_engine import GeminiEngine
+from models.grok_engine import GrokEngine
+from models.rag_manager import RAGManager
+from models.vector_index import VECTOR_BACKENDS
+from utils.helpers import extract_json
+
+RESULTS_DIR = os.path.join("benchmarks", "results")
+
+
+def latency_summary(samples_seconds):
+    """p50/p95/p99/mean/max in milliseconds plus throughput for a list of per-call durations."""
+    ordered = sorted(samples_seconds)
+    if not ordered:
+        return {}
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    total = sum(ordered)
+    return {
+        "count": len(ordered),
+        "p50_ms": round(pct(50), 4),
+        "p95_ms": round(pct(95), 4),
+        "p99_ms": round(pct(99), 4),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 4),
+        "max_ms": round(ordered[-1] * 1000, 4),
+        "throughput_per_s": round(len(ordered) / total, 2) if total else None
+    }
+
+
+def timed_calls(func, inputs):
+    samples = []
+    for item in inputs:
+        start = time.perf_counter()
+        func(item)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def traced(func):
+    """Runs func once under tracemalloc. Returns (result, seconds, peak Python heap bytes)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def with_peak(func):
+    """Runs one benchmark section under tracemalloc and adds its peak Python heap as "peak_mb"."""
+    result, _, peak = traced(func)
+    result["peak_mb"] = round(peak / 2**20, 2)
+    return result
+
+
+def bench_extract_json(n):
+    rows = [row[3] for row in generate_rows(n, seed=3)]
+    responses = []
+    for i, payload in enumerate(rows):
+        kind = i % 4
+        if kind == 0:
+            responses.append(payload)
+        elif kind == 1:
+            responses.append(f"İşte promptunuz:\n```json\n{payload}\n```\nİyi çalışmalar!")
+        elif kind == 2:
+            responses.append(f"Tabii ki! Aşağıdaki JSON {{placeholder}} içerir: {payload} Başka bir şey?")
+        else:
+            responses.append("CFG Scale, modelin prompta ne kadar sadık kalacağını belirler. " * 5)
+
+    samples = timed_calls(extract_json, responses)
+    summary = latency_summary(samples)
+    summary["bytes_per_s"] = round(sum(len(r.encode("utf-8")) for r in responses) / sum(samples), 2)
+    return summary
+
+
+def bench_prompt_build(n, context_examples):
+    grok = GrokEngine(api_key="benchmark", use_cache=False)
+    gemini = GeminiEngine(api_key="benchmark", use_cache=False)
+    queries = generate_queries(n, seed=11)
+    return {
+        "grok_messages": with_peak(
+            lambda: latency_summary(timed_calls(lambda q: grok._build_messages(q, context_examples), queries))
+        ),
+        "gemini_prompt": with_peak(
+            lambda: latency_summary(timed_calls(lambda q: gemini._build_prompt(q, context_examples), queries))
+        )
+    }
+
+
+def bench_rag(size, workdir, n_queries, embedding, vector_backend="chroma"):
+    excel_path = os.path.join(workdir, f"prompts_{size}.xlsx")
+    write_excel(excel_path, size)
+    embedding_function = HashEmbeddingFunction() if embedding == "stub" else LazyEmbeddingFunction()
+
+    def build():
+        return RAGManager(
+            excel_path=excel_path,
+            db_path=os.path.join(workdir, f"chroma_{size}", "db"),
+            test_data_path=os.path.join(workdir, f"test_set_{size}.json"),
+            embedding_store_path=os.path.join(workdir, f"embeddings_{size}"),
+            columnar_cache_dir=os.path.join(workdir, f"columnar_{size}"),
+            embedding_function=embedding_function,
+            vector_backend=vector_backend
+        )
+
+    rag, ingest_seconds, ingest_peak = traced(build)
+    result = {
+        "rows": size,
+        "vector_backend": vector_backend,
+        "ingestion": {
+            "seconds": round(ingest_seconds, 3),
+            "rows_per_s": round(size / ingest_seconds, 2),
+            "peak_mb": round(ingest_peak / 2**20, 2)
+        }
+    }
+
+    start = time.perf_counter()
+    rag.refresh_db()
+    result["refresh_unchanged_seconds"] = round(time.perf_counter() - start, 3)
+
+    queries = generate_queries(n_queries)
+
+    def cold_query(q):
+        rag._query_embedding_cache.clear()
+        rag._query_result_cache.clear()
+        rag.query_db(q)
+
+    result["query_cold"] = with_peak(lambda: latency_summary(timed_calls(cold_query, queries)))
+    result["query_warm"] = with_peak(lambda: latency_summary(timed_calls(rag.query_db, queries)))
+
+    def batch_query():
+        rag._query_embedding_cache.clear()
+        rag._query_result_cache.clear()
+        start = time.perf_counter()
+        rag.query_db_batch(queries)
+        batch_seconds = time.perf_counter() - start
+        return {
+            "queries": len(queries),
+            "seconds": round(batch_seconds, 4),
+            "throughput_per_s": round(len(queries) / batch_seconds, 2)
+        }
+
+    result["query_batch"] = with_peak(batch_query)
+
+    # End-to-end pipeline with a stub LLM: retrieval -> prompt build -> engine -> parse
+    engine = StubEngine()
+    grok = GrokEngine(api_key="benchmark", use_cache=False)
+
+    def pipeline(q):
+        context = rag.query_db(q)
+        grok._build_messages(q, context)
+        extract_json(engine.generate_response(q, context))
+
+    result["pipeline_stub_llm"] = with_peak(lambda: latency_summary(timed_calls(pipeline, queries)))
+    return result, rag.query_db(queries[0])
+
+
+def compare(current, baseline_path, threshold):
+    """Prints p95 / duration / peak_mb regressions above `threshold` (fraction) against a previous results file."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    def flatten(data, prefix=""):
+        flat = {}
+        for key, value in data.items():
+            path = f"{prefix}{key}"
+            if isinstance(value, dict):
+                flat.update(flatten(value, path + "."))
+            elif isinstance(value, (int, float)):
+                flat[path] = value
+        return flat
+
+    old, new = flatten(baseline["benchmarks"]), flatten(current["benchmarks"])
+    regressions = []
+    for key, new_value in new.items():
+        old_value = old.get(key)
+        if not old_value or not key.endswith(("p95_ms", "seconds", "peak_mb")):
+            continue
+        change = (new_value - old_value) / old_value
+        if change > threshold:
+            regressions.append((key, old_value, new_value, change))
+
+    if regressions:
+        print(f"\n⚠️  {len(regressions)} regression(s) vs {baseline_path}:")
+        for key, old_value, new_value, change in regressions:
+            print(f"   {key}: {old_value} -> {new_value} (+{change:.0%})")
+    else:
+        print(f"\n✅ No regressions above {threshold:.0%} vs {baseline_path}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="StableGen offline benchmark suite")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--parse-samples", type=int, default=2000)
+    parser.add_argument("--embedding", choices=["stub", "minilm"], default="stub")
+    parser.add_argument("--vector-backend", choices=VECTOR_BACKENDS, default="chroma", help="RAG retrieval backend")
+    parser.add_argument("--out", default=None, help="Output JSON path (default: benchmarks/results/bench_<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="Previous results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Regression threshold for --compare")
+    args = parser.parse_args()
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "embedding": args.embedding,
+            "vector_backend": args.vector_backend
+        },
+        "benchmarks": {}
+    }
+
+    print("🔵 extract_json...")
+    results["benchmarks"]["extract_json"] = with_peak(lambda: bench_extract_json(args.parse_samples))
+
+    workdir = tempfile.mkdtemp(prefix="stablegen_bench_")
+    context_examples = []
+    try:
+        for size in args.sizes:
+            print(f"🔵 RAG ({size} rows)...")
+            results["benchmarks"][f"rag_{size}"], context_examples = bench_rag(
+                size, workdir, args.queries, args.embedding, args.vector_backend
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print("🔵 prompt construction...")
+    results["benchmarks"]["prompt_build"] = bench_prompt_build(args.parse_samples, context_examples)
+    results["meta"]["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    out_path = args.out or os.path.join(RESULTS_DIR, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"🏁 Results written to {out_path}")
+
+    if args.compare:
+        compare(results, args.compare, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import asyncio
+import hashlib
+import json
+import re
+import time
+import numpy as np
+from chromadb import EmbeddingFunction
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+class HashEmbeddingFunction(EmbeddingFunction):
+    """
+    Deterministic feature-hashing embedder (bag of words -> normalized vector).
+    Lets ingestion/retrieval be benchmarked without downloading or running MiniLM.
+    """
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def __call__(self, input):
+        vectors = np.zeros((len(input), self.dim), dtype=np.float32)
+        for row, text in enumerate(input):
+            for token in _TOKEN_PATTERN.findall(text.lower()):
+                bucket = int(hashlib.md5(token.encode("utf-8")).hexdigest()[:8], 16)
+                vectors[row, bucket % self.dim] += 1.0 if bucket & 1 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).tolist()
+
+
+class StubEngine:
+    """
+    Stands in for GrokEngine/GeminiEngine: same generate_response interface,
+    canned answer after a fixed delay, no network.
+    """
+
+    def __init__(self, latency_seconds=0.0, model="stub"):
+        self.latency_seconds = latency_seconds
+        self.model = model
+
+    def _answer(self, user_input):
+        if user_input.rstrip().endswith("?"):
+            return f"{user_input} sorusunun cevabı: bu bir açıklama metnidir."
+        return json.dumps({
+            "positive_prompt": f"{user_input}, highly detailed, 8k",
+            "negative_prompt": "blur, low quality",
+            "cfg_scale": 7.0,
+            "steps": 30,
+            "sampler": "Euler a"
+        }, ensure_ascii=False)
+
+    def generate_response(self, user_input, context_examples=None):
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return self._answer(user_input)
+
+    def generate_response_stream(self, user_input, context_examples=None):
+        response = self.generate_response(user_input, context_examples)
+        for start in range(0, len(response), 16):
+            yield response[start:start + 16]
+
+    async def agenerate_response(self, user_input, context_examples=None):
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        return self._answer(user_input)
+
+    async def agenerate_response_stream(self, user_input, context_examples=None):
+        response = await self.agenerate_response(user_input, context_examples)
+        for start in range(0, len(response), 16):
+            yield response[start:start + 16]
@@ -0,0 +1,84 @@
+import json
+import random
+from openpyxl import Workbook
+
+# Vocabulary in the style of data/sd_prompts.xlsx
+SUBJECTS = [
+    "dragon", "kedi", "astronot", "samuray", "deniz feneri", "orman", "şato", "robot", "balerin",
+    "modern kitchen", "bedroom", "kütüphane", "tren istasyonu", "çay bahçesi", "tea", "araba", "kule"
+]
+CITIES = ["İstanbul", "Tokyo", "Paris", "Dubai", "Jakarta", "Turin", "New York", "Kapadokya", "Venedik"]
+STYLES = [
+    "Cyberpunk", "Van Gogh", "Glitch Art", "Acrylic", "Charcoal", "Dieselpunk", "Steampunk", "Watercolor",
+    "Durer", "Ukiyo-e", "Art Nouveau", "Pixel Art", "Low Poly", "Baroque", "Film Noir"
+]
+MOODS = ["dreamy", "pastel", "tragedy", "bright", "dark", "melancholic", "neon", "minimal", "epic"]
+TERMS = ["CFG Scale", "Seed", "Sampler", "Steps", "VAE", "Embedding", "LoRA", "Negative prompt", "Denoising strength"]
+SAMPLERS = ["Euler a", "DPM++ 2M Karras", "DDIM", "UniPC"]
+
+INPUT_TEMPLATES = [
+    "{style} tarzında {mood} {city} manzarası",
+    "{style} stiliyle {subject} tablosu",
+    "{style} tarzı {subject} tasarımı",
+    "{mood} {subject} fotoğrafı, profesyonel çekim",
+    "{city} sokaklarında {mood} bir {subject}, {style} tarzında",
+]
+
+
+def _generate_json_row(rng, rich):
+    style, mood = rng.choice(STYLES), rng.choice(MOODS)
+    subject, city = rng.choice(SUBJECTS), rng.choice(CITIES)
+    user_input = rng.choice(INPUT_TEMPLATES).format(style=style, mood=mood, subject=subject, city=city)
+    style_tags = ", ".join([style.lower(), mood, subject, city.lower()])
+    output = {
+        "positive_prompt": f"{mood} {subject} in {city}, {style} style, highly detailed, 8k, masterpiece",
+        "negative_prompt": "blur, low quality, distortion, watermark, text",
+        "cfg_scale": rng.choice([6.5, 7.0, 7.5, 8.0]),
+        "steps": rng.choice([25, 30, 40]),
+        "sampler": rng.choice(SAMPLERS)
+    }
+    if rich:
+        # A few rows carry large scene_graph-like structures, as in the real sheet
+        output["scene_graph"] = {
+            "subject": {"description": f"{subject} " * 20, "pose": "standing, three-quarter view"},
+            "environment": {"setting": f"{city} at dusk", "key_elements": [f"element {i}" for i in range(15)]},
+            "lighting": {"type": "soft diffuse", "source": "golden hour sun", "shadows": "long, subtle"},
+            "camera": {"shot_type": "medium shot", "angle": "eye-level", "lens": "35mm f/1.4"}
+        }
+    return user_input, "generate_json", style_tags, json.dumps(output, ensure_ascii=False)
+
+
+def _explain_term_row(rng):
+    term = rng.choice(TERMS)
+    user_input = rng.choice([f"{term} nedir?", f"{term} parametresi ne işe yarar?", f"{term} nasıl ayarlanır?"])
+    output = {
+        "explanation": f"{term}, Stable Diffusion üretim sürecini etkileyen bir parametredir. " * 3,
+        "recommended_value": "Genellikle varsayılan değer idealdir."
+    }
+    return user_input, "explain_term", "technical, help, explanation", json.dumps(output, ensure_ascii=False)
+
+
+def generate_rows(n_rows, seed=42, explain_ratio=0.16, rich_ratio=0.01):
+    """Yields (user_input, intent, style_tags, json_output) tuples with the sheet's intent/size mix."""
+    rng = random.Random(seed)
+    for _ in range(n_rows):
+        if rng.random() < explain_ratio:
+            yield _explain_term_row(rng)
+        else:
+            yield _generate_json_row(rng, rich=rng.random() < rich_ratio)
+
+
+def generate_queries(n_queries, seed=7):
+    """Synthetic user inputs for retrieval benchmarks (same distribution, different seed)."""
+    return [row[0] for row in generate_rows(n_queries, seed=seed)]
+
+
+def write_excel(path, n_rows, seed=42):
+    """Writes a synthetic prompt sheet with the same columns as data/sd_prompts.xlsx."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(["user_input", "intent", "style_tags", "json_output"])
+    for row in generate_rows(n_rows, seed=seed):
+        ws.append(list(row))
+    wb.save(path)
+    return path
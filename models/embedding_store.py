@@ -0,0 +1,159 @@
+import hashlib
+import os
+import threading
+import numpy as np
+from chromadb import EmbeddingFunction
+from chromadb.utils import embedding_functions
+from models.versioned_store import VersionedFileStore
+
+
+class LazyEmbeddingFunction(EmbeddingFunction):
+    """
+    Chroma embedding function that defers loading the SentenceTransformer model
+    until the first text actually has to be embedded (thread-safe).
+    """
+
+    def __init__(self, model_name="all-MiniLM-L6-v2"):
+        self.model_name = model_name
+        self._func = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._func is None:
+            with self._lock:
+                if self._func is None:
+                    self._func = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=self.model_name)
+        return self._func
+
+    @property
+    def is_loaded(self):
+        return self._func is not None
+
+    def __call__(self, input):
+        return self._load()(input)
+
+
+class EmbeddingStore(VersionedFileStore):
+    """
+    Precomputed document embeddings kept in a flat, memory-mapped vector file.
+
+    Layout under `path` (see VersionedFileStore for the commit / compaction rules):
+        vectors[.N].bin - raw row-major float32/float16 matrix, one row per document
+        index.json      - {"dim": int, "dtype": str, "keys": [doc_hash, ...], "file": str, "generation": int}
+                          (row i <-> keys[i]; "file" names the current vector file)
+        .lock           - inter-process lock for append / compact
+
+    Rows are keyed by a hash of the embedded document text, so any process (or a fresh
+    Chroma db_path) can reuse vectors instead of re-running the model. Vectors are read
+    through np.memmap, i.e. paged in from disk on demand rather than copied onto the heap.
+    """
+
+    file_prefix = "vectors"
+
+    def __init__(self, path="database/embeddings", dtype="float32"):
+        self.dtype = np.dtype(dtype)
+        self.dim = None
+        self.keys = []
+        self.key_to_row = {}
+        self.vectors = None
+        super().__init__(path)
+
+    @staticmethod
+    def doc_key(document):
+        return hashlib.sha1(document.encode("utf-8")).hexdigest()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _load_index(self, index):
+        if not os.path.exists(self.data_path):
+            return
+        self.dim = index["dim"]
+        self.dtype = np.dtype(index["dtype"])
+        self.keys = index["keys"]
+        self.key_to_row = {key: row for row, key in enumerate(self.keys)}
+        self.vectors = self._open_memmap(len(self.keys))
+
+    def _index_fields(self):
+        return {"dim": self.dim, "dtype": self.dtype.name, "keys": self.keys}
+
+    def _open_memmap(self, rows):
+        if not rows:
+            return None
+        return np.memmap(self.data_path, dtype=self.dtype, mode="r", shape=(rows, self.dim))
+
+    def get(self, keys):
+        """Returns {key: vector} for the keys present in the store (vectors are memmap views)."""
+        with self._lock:
+            self._refresh()
+            if self.vectors is None:
+                return {}
+            return {key: self.vectors[self.key_to_row[key]] for key in keys if key in self.key_to_row}
+
+    def append(self, keys, vectors):
+        """Appends new rows; keys already in the store are skipped."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._write_lock():
+            self._refresh()
+            fresh, pending = [], set()
+            for i, key in enumerate(keys):
+                if key not in self.key_to_row and key not in pending:
+                    fresh.append(i)
+                    pending.add(key)
+            if not fresh:
+                return
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+            os.makedirs(self.path, exist_ok=True)
+            # Write right after the indexed (or batch-staged) rows: bytes left by a write that crashed
+            # before the index update are overwritten instead of shifting every later row
+            with open(self.data_path, "r+b" if os.path.exists(self.data_path) else "wb") as f:
+                f.seek(len(self.keys) * self.dim * self.dtype.itemsize)
+                f.write(np.ascontiguousarray(vectors[fresh], dtype=self.dtype).tobytes())
+                f.truncate()
+            for i in fresh:
+                self.key_to_row[keys[i]] = len(self.keys)
+                self.keys.append(keys[i])
+            self._commit()
+            self.vectors = self._open_memmap(len(self.keys))
+
+    def compact(self, live_keys):
+        """Rewrites the store keeping only `live_keys` (drops vectors of removed documents)."""
+        with self._write_lock():
+            self._refresh()
+            if self.vectors is None:
+                return
+            kept = [key for key in self.keys if key in live_keys]
+            if len(kept) == len(self.keys):
+                return
+            new_file = self._next_data_file()
+            with open(os.path.join(self.path, new_file), "wb") as f:
+                for key in kept:
+                    f.write(np.asarray(self.vectors[self.key_to_row[key]]).tobytes())
+            self.keys = kept
+            self.key_to_row = {key: row for row, key in enumerate(kept)}
+            # Unmap the old file before it is removed
+            self.vectors = None
+            self._switch_data_file(new_file)
+            self.vectors = self._open_memmap(len(kept))
+            print(f"Embedding store compacted to {len(kept)} vectors.")
+
+
+if __name__ == "__main__":
+    # Build step: python -m models.embedding_store [--dtype float16]
+    import argparse
+    from models.rag_manager import RAGManager
+
+    parser = argparse.ArgumentParser(description="Precompute document embeddings into the memory-mapped store.")
+    parser.add_argument("--excel-path", default="data/sd_prompts.xlsx")
+    parser.add_argument("--db-path", default="database/chroma_db")
+    parser.add_argument("--store-path", default="database/embeddings")
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float16"])
+    args = parser.parse_args()
+
+    RAGManager(
+        excel_path=args.excel_path, db_path=args.db_path,
+        embedding_store_path=args.store_path, embedding_dtype=args.dtype,
+        # Only the store is built; the Chroma collection is left as it is
+        auto_initialize=False
+    ).build_embedding_store()
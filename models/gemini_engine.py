@@ -1,79 +1,78 @@
 from google import genai
+from google.genai import types
 import os
+from models.prompt_builder import build_prompt
+from utils.cache import get_default_cache
+from utils.engine_mixin import CachedEngineMixin
 
-class GeminiEngine:
-    def __init__(self, api_key):
-        self.client = genai.Client(api_key=api_key)
+class GeminiEngine(CachedEngineMixin):
+    error_prefix = "Error communicating with Gemini"
+
+    def __init__(self, api_key, cache=None, use_cache=True, base_url=None):
+        # base_url / GEMINI_BASE_URL can point the client at a local stand-in (benchmarks/mock_llm_server.py)
+        base_url = base_url or os.getenv("GEMINI_BASE_URL")
+        http_options = types.HttpOptions(base_url=base_url) if base_url else None
+        self.client = genai.Client(api_key=api_key, http_options=http_options)
         self.model = 'gemini-2.0-flash'
+        # Response cache (None = bypass). Defaults to the shared on-disk cache.
+        self.cache = (cache or get_default_cache()) if use_cache else None
+
+    def _build_prompt(self, user_input, context_examples=None):
+        """Builds the full prompt (static system instructions + RAG examples + user input)."""
+        return build_prompt(user_input, context_examples)
 
     def generate_response(self, user_input, context_examples=None):
         """
         Generates a response using Google Gemini 2.0 Flash.
-        
+
         Args:
             user_input (str): The user's message.
             context_examples (list): List of similar examples for Few-Shot learning.
         """
-        
-        system_instructions = """
-        Sen "StableGen Assistant" adında bir yapay zeka asistanısın.
-        Görevin: Kullanıcıların metin tabanlı fikirlerini Stable Diffusion için optimize edilmiş JSON formatına dönüştürmek veya teknik konularda bilgi vermek.
-        
-        KURALLAR:
-        1. Eğer kullanıcı bir görsel, resim, çizim veya sahne tasviri istiyorsa (Niyet: generate_json):
-           - SADECE geçerli bir JSON objesi döndür.
-           - Markdown blokları (```json ... ```) KULLANMA.
-           - ÖNCELİK: Eğer RAG Context içinde (Referans Örnekler) kullanıcı isteğine benzer karmaşık bir JSON yapısı (blueprint, scene_graph, actors vb.) varsa, MUTLAKA o yapıyı ve detay seviyesini takip et.
-           - Eğer RAG'dan özel bir yapı gelmezse bile varsayılan yapıyı zenginleştir. Sadece `positive_prompt` değil, `scene_description`, `lighting`, `camera_settings` gibi alt alanlar ekle.
-           
-           Örnek Zengin Yapı (Eğer RAG'da yoksa bunu kullan):
-           {
-             "scene": {
-               "description": "Detaylı sahne açıklaması...",
-               "mood": "Atmosfer ve duygu...",
-               "lighting": "Işıklandırma detayları..."
-             },
-             "subject": {
-               "description": "Ana obje/karakter detayları...",
-               "pose": "Duruş veya pozisyon..."
-             },
-             "technical": {
-               "camera": "Lens ve kamera tipi...",
-               "style": "Sanat stili (örn: fotorealistik, yağlı boya)..."
-             },
-             "generation_params": {
-               "positive_prompt": "Tüm detayların birleştiği ana prompt...",
-               "negative_prompt": "İstenmeyen özellikler...",
-               "cfg_scale": 7.0,
-               "steps": 30,
-               "sampler": "Euler a"
-             }
-           }
-           - Positive prompt içine RAG ile gelen stil önerilerini veya kullanıcının istediği stili yedir.
-        
-        2. Eğer kullanıcı teknik bir terim soruyor veya sohbet ediyorsa (Niyet: explain_term / greeting):
-           - Normal, açıklayıcı bir metin (String) olarak cevap ver.
-           - JSON döndürme.
-           
-        3. Asla yorum satırı ekleme, sadece istenen formatı ver.
+        full_prompt = self._build_prompt(user_input, context_examples)
+
+        def call():
+            return self.client.models.generate_content(model=self.model, contents=full_prompt).text
+
+        return self._complete(user_input, full_prompt, "sync", call)
+
+    def generate_response_stream(self, user_input, context_examples=None):
         """
-        
-        # Construct the prompt with context
-        full_prompt = system_instructions + "\n\n"
-        
-        if context_examples:
-            full_prompt += "REFERANS ALINACAK BAŞARILI ÖRNEKLER (RAG Context):\n"
-            for example in context_examples:
-                full_prompt += f"- {example}\n"
-            full_prompt += "\n"
-            
-        full_prompt += f"KULLANICI İSTEĞİ: {user_input}"
-        
-        try:
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=full_prompt
-            )
+        Streams the response of Gemini as text chunks (generate_content_stream).
+        A cached response is yielded as a single chunk; on failure the error string is yielded.
+
+        Args:
+            user_input (str): The user's message.
+            context_examples (list): List of similar examples for Few-Shot learning.
+        """
+        full_prompt = self._build_prompt(user_input, context_examples)
+
+        def stream():
+            for chunk in self.client.models.generate_content_stream(model=self.model, contents=full_prompt):
+                if chunk.text:
+                    yield chunk.text
+
+        return self._complete_stream(user_input, full_prompt, "stream", stream)
+
+    async def agenerate_response(self, user_input, context_examples=None):
+        """Async version of generate_response (client.aio); many calls can share one event loop."""
+        full_prompt = self._build_prompt(user_input, context_examples)
+
+        async def call():
+            response = await self.client.aio.models.generate_content(model=self.model, contents=full_prompt)
             return response.text
-        except Exception as e:
-            return f"Error communicating with Gemini: {str(e)}"
+
+        return await self._acomplete(user_input, full_prompt, "async", call)
+
+    def agenerate_response_stream(self, user_input, context_examples=None):
+        """Async version of generate_response_stream; returns an async iterator of text chunks."""
+        full_prompt = self._build_prompt(user_input, context_examples)
+
+        async def stream():
+            async for chunk in await self.client.aio.models.generate_content_stream(
+                model=self.model, contents=full_prompt
+            ):
+                if chunk.text:
+                    yield chunk.text
+
+        return self._acomplete_stream(user_input, full_prompt, "async_stream", stream)
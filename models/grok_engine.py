@@ -1,84 +1,126 @@
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 import json
+import os
+from models.prompt_builder import build_messages
+from utils.cache import ResponseCache, get_default_cache
+from utils.engine_mixin import CachedEngineMixin
 
-class GrokEngine:
-    def __init__(self, api_key):
-        # xAI uses the OpenAI SDK format but with a different base URL
+DEFAULT_BASE_URL = "https://api.x.ai/v1"
+
+class GrokEngine(CachedEngineMixin):
+    error_prefix = "Error communicating with xAI Grok"
+
+    def __init__(self, api_key, cache=None, use_cache=True, base_url=None):
+        # xAI uses the OpenAI SDK format but with a different base URL.
+        # base_url / XAI_BASE_URL can point it at a local stand-in (benchmarks/mock_llm_server.py).
+        self.api_key = api_key
+        self.base_url = base_url or os.getenv("XAI_BASE_URL") or DEFAULT_BASE_URL
         self.client = OpenAI(
             api_key=api_key,
-            base_url="https://api.x.ai/v1",
+            base_url=self.base_url,
         )
+        # Created on first async call; bound to the event loop that first uses it
+        self._async_client = None
         self.model = "grok-2-latest" # Using the latest model as per xAI docs
+        self.temperature = 0.7
+        # Response cache (None = bypass). Defaults to the shared on-disk cache.
+        self.cache = (cache or get_default_cache()) if use_cache else None
+
+    def _build_messages(self, user_input, context_examples=None):
+        """Builds the chat messages (static system prompt + RAG examples + user input)."""
+        # The system message is identical on every request, so xAI can reuse its cached prefix
+        return build_messages(user_input, context_examples)
+
+    def _cache_key(self, messages):
+        return ResponseCache.make_key(self.model, messages, {"temperature": self.temperature})
+
+    @staticmethod
+    def _request_text(messages):
+        """Text actually sent to the API, for the prompt size metrics."""
+        return "\n".join(message["content"] for message in messages)
+
+    @staticmethod
+    def _delta(chunk):
+        """Text of one streamed chunk (None for keep-alive / empty chunks)."""
+        return chunk.choices[0].delta.content if chunk.choices else None
 
     def generate_response(self, user_input, context_examples=None):
         """
         Generates a response using xAI Grok.
-        
+
         Args:
             user_input (str): The user's message.
             context_examples (list): List of similar examples for Few-Shot learning.
         """
-        
-        system_prompt = """
-        Sen "StableGen Assistant" adında bir yapay zeka asistanısın.
-        Görevin: Kullanıcıların metin tabanlı fikirlerini Stable Diffusion için optimize edilmiş JSON formatına dönüştürmek veya teknik konularda bilgi vermek.
-        
-        KURALLAR:
-        1. Eğer kullanıcı bir görsel, resim, çizim veya sahne tasviri istiyorsa (Niyet: generate_json):
-           - SADECE geçerli bir JSON objesi döndür.
-           - Markdown blokları (```json ... ```) KULLANMA.
-           - ÖNCELİK: Eğer RAG Context içinde (Referans Örnekler) kullanıcı isteğine benzer karmaşık bir JSON yapısı (blueprint, scene_graph, actors vb.) varsa, MUTLAKA o yapıyı ve detay seviyesini takip et.
-           - Eğer RAG'dan özel bir yapı gelmezse bile varsayılan yapıyı zenginleştir. Sadece `positive_prompt` değil, `scene_description`, `lighting`, `camera_settings` gibi alt alanlar ekle.
-           
-           Örnek Zengin Yapı (Eğer RAG'da yoksa bunu kullan):
-           {
-             "scene": {
-               "description": "Detaylı sahne açıklaması...",
-               "mood": "Atmosfer ve duygu...",
-               "lighting": "Işıklandırma detayları..."
-             },
-             "subject": {
-               "description": "Ana obje/karakter detayları...",
-               "pose": "Duruş veya pozisyon..."
-             },
-             "technical": {
-               "camera": "Lens ve kamera tipi...",
-               "style": "Sanat stili (örn: fotorealistik, yağlı boya)..."
-             },
-             "generation_params": {
-               "positive_prompt": "Tüm detayların birleştiği ana prompt...",
-               "negative_prompt": "İstenmeyen özellikler...",
-               "cfg_scale": 7.0,
-               "steps": 30,
-               "sampler": "Euler a"
-             }
-           }
-           - Positive prompt içine RAG ile gelen stil önerilerini veya kullanıcının istediği stili yedir.
-        
-        2. Eğer kullanıcı teknik bir terim soruyor veya sohbet ediyorsa (Niyet: explain_term / greeting):
-           - Normal, açıklayıcı bir metin (String) olarak cevap ver.
-           - JSON döndürme.
-           
-        3. Asla yorum satırı ekleme, sadece istenen formatı ver.
-        """
-        
-        messages = [
-            {"role": "system", "content": system_prompt}
-        ]
-        
-        # Add Few-Shot Examples if provided (Context from RAG)
-        if context_examples:
-            for example in context_examples:
-                messages.append({"role": "user", "content": "Örnek Bağlam (RAG): " + example})
-        
-        messages.append({"role": "user", "content": user_input})
-        
-        try:
+        messages = self._build_messages(user_input, context_examples)
+
+        def call():
             response = self.client.chat.completions.create(
                 model=self.model,
                 messages=messages,
-                temperature=0.7
+                temperature=self.temperature
+            )
+            return response.choices[0].message.content
+
+        return self._complete(user_input, messages, "sync", call)
+
+    def generate_response_stream(self, user_input, context_examples=None):
+        """
+        Streams the response of xAI Grok as text chunks (OpenAI-compatible stream).
+        A cached response is yielded as a single chunk; on failure the error string is yielded.
+
+        Args:
+            user_input (str): The user's message.
+            context_examples (list): List of similar examples for Few-Shot learning.
+        """
+        messages = self._build_messages(user_input, context_examples)
+
+        def stream():
+            for chunk in self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=self.temperature,
+                stream=True
+            ):
+                delta = self._delta(chunk)
+                if delta:
+                    yield delta
+
+        return self._complete_stream(user_input, messages, "stream", stream)
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
+        return self._async_client
+
+    async def agenerate_response(self, user_input, context_examples=None):
+        """Async version of generate_response (AsyncOpenAI); many calls can share one event loop."""
+        messages = self._build_messages(user_input, context_examples)
+
+        async def call():
+            response = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=self.temperature
             )
             return response.choices[0].message.content
-        except Exception as e:
-            return f"Error communicating with xAI Grok: {str(e)}"
+
+        return await self._acomplete(user_input, messages, "async", call)
+
+    def agenerate_response_stream(self, user_input, context_examples=None):
+        """Async version of generate_response_stream; returns an async iterator of text chunks."""
+        messages = self._build_messages(user_input, context_examples)
+
+        async def stream():
+            async for chunk in await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=self.temperature,
+                stream=True
+            ):
+                delta = self._delta(chunk)
+                if delta:
+                    yield delta
+
+        return self._acomplete_stream(user_input, messages, "async_stream", stream)
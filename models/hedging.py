@@ -0,0 +1,193 @@
+import asyncio
+import collections
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from utils.concurrency import is_error_response
+from utils.helpers import extract_json
+
+
+class LatencyWindow:
+    """Thread-safe rolling window of call durations (seconds) with percentile lookup."""
+
+    def __init__(self, size=200):
+        self._samples = collections.deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, p):
+        with self._lock:
+            ordered = sorted(self._samples)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))]
+
+
+class HedgedEngine:
+    """
+    Races two engines (e.g. Grok and Gemini) with a hedged request.
+
+    The request goes to the primary engine first. If it has not produced a usable answer
+    after hedge_delay seconds (by default the primary's rolling p95 latency), the same
+    request is sent to the secondary engine. The first usable answer wins and the other
+    call is cancelled. A usable answer is any non-error response, or with require_json=True
+    only a response extract_json can parse (explain-term answers are plain text, so the
+    chat default accepts text too). If neither engine produces one, the last response is returned.
+
+    Exposes the same generate_response / agenerate_response(_stream) interface as the engines,
+    so it can be passed to ChatPipeline as-is.
+    """
+
+    def __init__(self, primary, secondary, hedge_delay=None, percentile=0.95,
+                 min_delay=0.3, max_delay=10.0, default_delay=2.0, min_samples=20, require_json=False):
+        """
+        Args:
+            primary, secondary: Engine instances.
+            hedge_delay (float): Fixed delay in seconds before the secondary is fired. None = p95-based.
+            percentile (float): Percentile of the primary's recent latencies used as the delay.
+            min_delay / max_delay (float): Bounds for the computed delay.
+            default_delay (float): Delay used until min_samples latencies are known.
+            require_json (bool): Only accept responses that contain a JSON prompt.
+        """
+        self.primary = primary
+        self.secondary = secondary
+        self.hedge_delay = hedge_delay
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self.require_json = require_json
+        self.model = f"{primary.model}+{secondary.model}"
+        self.latencies = {id(primary): LatencyWindow(), id(secondary): LatencyWindow()}
+        self.stats = {"requests": 0, "hedged": 0, "primary_wins": 0, "secondary_wins": 0, "no_usable": 0}
+        self._stats_lock = threading.Lock()
+        # Only used by the sync path; the losing thread cannot be interrupted, its result is dropped
+        self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedged-request")
+
+    def current_delay(self):
+        """Seconds to wait for the primary before hedging."""
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        window = self.latencies[id(self.primary)]
+        if len(window) < self.min_samples:
+            return self.default_delay
+        return min(self.max_delay, max(self.min_delay, window.percentile(self.percentile)))
+
+    def _is_usable(self, response):
+        if not response or is_error_response(response):
+            return False
+        return not self.require_json or extract_json(response) is not None
+
+    def _count(self, *keys):
+        with self._stats_lock:
+            for key in keys:
+                self.stats[key] += 1
+
+    def _finish(self, winner, hedged):
+        keys = ["requests"] + (["hedged"] if hedged else [])
+        if winner is self.primary:
+            keys.append("primary_wins")
+        elif winner is self.secondary:
+            keys.append("secondary_wins")
+        else:
+            keys.append("no_usable")
+        self._count(*keys)
+
+    async def _timed_call(self, engine, user_input, context_examples):
+        start = time.perf_counter()
+        try:
+            response = await engine.agenerate_response(user_input, context_examples)
+        except asyncio.CancelledError:
+            # Lost the race: its latency is at least the time it ran. Without this lower-bound sample
+            # the window would only see fast wins and the p95 delay would keep shrinking.
+            self.latencies[id(engine)].add(time.perf_counter() - start)
+            raise
+        if not is_error_response(response):
+            self.latencies[id(engine)].add(time.perf_counter() - start)
+        return response
+
+    async def agenerate_response(self, user_input, context_examples=None):
+        """Hedged async call; the losing request is cancelled."""
+        tasks = {asyncio.ensure_future(self._timed_call(self.primary, user_input, context_examples)): self.primary}
+        hedged = False
+        deadline = self.current_delay()
+        last_response = None
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(
+                    tasks, timeout=None if hedged else deadline, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done or (not hedged and not any(self._is_usable(t.result()) for t in done if not t.exception())):
+                    # Primary is slow (or already failed): fire the secondary
+                    if not hedged:
+                        hedged = True
+                        tasks[asyncio.ensure_future(self._timed_call(self.secondary, user_input, context_examples))] = self.secondary
+                for task in done:
+                    engine = tasks.pop(task)
+                    if task.exception():
+                        last_response = f"Error communicating with {engine.model}: {task.exception()}"
+                        continue
+                    last_response = task.result()
+                    if self._is_usable(last_response):
+                        self._finish(engine, hedged)
+                        if hedged:
+                            print(f"⚡ Hedged istek: {engine.model} kazandı")
+                        return last_response
+        finally:
+            for task in tasks:
+                task.cancel()
+        self._finish(None, hedged)
+        return last_response
+
+    async def agenerate_response_stream(self, user_input, context_examples=None):
+        """
+        Hedging needs the complete answer to decide a winner, so the winning response
+        is yielded as a single chunk.
+        """
+        yield await self.agenerate_response(user_input, context_examples)
+
+    def _sync_timed_call(self, engine, user_input, context_examples):
+        start = time.perf_counter()
+        response = engine.generate_response(user_input, context_examples)
+        if not is_error_response(response):
+            self.latencies[id(engine)].add(time.perf_counter() - start)
+        return response
+
+    def generate_response(self, user_input, context_examples=None):
+        """
+        Hedged blocking call (threads). The loser runs to completion in the background and is
+        ignored; its full latency is still recorded by _sync_timed_call.
+        """
+        futures = {self._executor.submit(self._sync_timed_call, self.primary, user_input, context_examples): self.primary}
+        hedged = False
+        deadline = self.current_delay()
+        last_response = None
+        while futures:
+            done, _ = wait(futures, timeout=None if hedged else deadline, return_when=FIRST_COMPLETED)
+            if not done or (not hedged and not any(self._is_usable(f.result()) for f in done if not f.exception())):
+                if not hedged:
+                    hedged = True
+                    futures[self._executor.submit(self._sync_timed_call, self.secondary, user_input, context_examples)] = self.secondary
+            for future in done:
+                engine = futures.pop(future)
+                if future.exception():
+                    last_response = f"Error communicating with {engine.model}: {future.exception()}"
+                    continue
+                last_response = future.result()
+                if self._is_usable(last_response):
+                    for pending in futures:
+                        pending.cancel()
+                    self._finish(engine, hedged)
+                    return last_response
+        self._finish(None, hedged)
+        return last_response
+
+    def generate_response_stream(self, user_input, context_examples=None):
+        yield self.generate_response(user_input, context_examples)
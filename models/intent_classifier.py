@@ -0,0 +1,136 @@
+import threading
+import numpy as np
+
+# Intents answered locally; everything else goes to the LLM
+LOCAL_INTENTS = ("greeting", "unknown")
+# Intents labeled in the RAG collection (intent column of the Excel source)
+COLLECTION_INTENTS = ("generate_json", "explain_term")
+
+# The source data only labels generate_json / explain_term, so the local intents are seeded here.
+# Kept disjoint from the hand-written hard cases in data/test_set.json so evaluation stays honest.
+SEED_EXAMPLES = {
+    "greeting": [
+        "Merhaba", "Selam", "Selamlar", "Merhabalar, nasılsınız?", "Naber?", "Hey, orada mısın?",
+        "İyi akşamlar", "İyi geceler", "Tünaydın", "Selamün aleyküm", "Kolay gelsin",
+        "Teşekkürler, çok sağ ol", "Eyvallah", "Hoşça kal", "Sonra görüşürüz", "Bay bay, iyi günler",
+        "Hello", "Hi there", "Good morning", "Thanks, bye"
+    ],
+    "unknown": [
+        "Kargom ne zaman gelir?", "Siparişimi iptal et", "Hesabımı nasıl silerim?", "Şifremi unuttum",
+        "Fatura bilgilerimi güncelle", "Müşteri hizmetlerine bağla", "Kampanya var mı?", "Kargo ücreti ne kadar?",
+        "Dolar kuru ne kadar?", "Bugün günlerden ne?", "Yarın yağmur yağacak mı?", "Maç kaç kaç bitti?",
+        "Bana bir şaka anlat", "Bu cevabı beğenmedim", "Boşver, gerek yok", "Tamam", "Anlamadım",
+        "asdfgh", "Where is my order?", "Cancel my subscription"
+    ]
+}
+
+CANNED_RESPONSES = {
+    "greeting": "Merhaba! 👋 Ben StableGen Assistant. Bir görsel fikrini yaz (örn: *\"Siberpunk İstanbul\"*), "
+                "senin için Stable Diffusion JSON promptu hazırlayayım; ya da *\"CFG Scale nedir?\"* gibi teknik bir terim sor.",
+    "unknown": "Bu konuda yardımcı olamıyorum. 🙂 Ben yalnızca Stable Diffusion için JSON prompt üretir ve "
+               "prompt mühendisliği terimlerini açıklarım. Bir görsel fikri veya teknik bir soru yazabilirsin."
+}
+
+
+class IntentClassifier:
+    """
+    Local kNN intent classifier over the same MiniLM embeddings the RAG collection uses.
+
+    Labeled vectors come from the Chroma collection (its `intent` metadata, no re-embedding)
+    plus the seeded greeting / unknown exemplars above. A query is classified by a
+    similarity-weighted vote of its k nearest neighbours (cosine). Only confident
+    greeting / unknown predictions are answered locally; generate_json, explain_term and
+    anything uncertain go to the LLM as before.
+
+    The query embedding goes through RAGManager.embed_queries, so the retrieval step that
+    follows reuses it from the cache and no extra model call is made.
+    """
+
+    def __init__(self, rag_manager, k=7, min_confidence=0.75, min_similarity=0.5, max_per_intent=5000):
+        """
+        Args:
+            rag_manager (RAGManager): Source of the labeled vectors and the embedding function.
+            k (int): Number of neighbours that vote.
+            min_confidence (float): Minimum vote share for a local answer.
+            min_similarity (float): Minimum cosine similarity of the nearest neighbour for a local answer.
+            max_per_intent (int): Cap on collection vectors loaded per intent (keeps the index small).
+        """
+        self.rag_manager = rag_manager
+        self.k = k
+        self.min_confidence = min_confidence
+        self.min_similarity = min_similarity
+        self.max_per_intent = max_per_intent
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._labels = None
+        self._intents = None
+        self._data_version = None
+
+    @staticmethod
+    def _normalize(matrix):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def _build_index(self):
+        vectors, labels = [], []
+        collection = self.rag_manager.collection
+        for intent in COLLECTION_INTENTS:
+            rows = collection.get(where={"intent": intent}, limit=self.max_per_intent, include=["embeddings"])
+            embeddings = rows.get("embeddings")
+            if embeddings is not None and len(embeddings):
+                vectors.append(np.asarray(embeddings, dtype=np.float32))
+                labels.extend([intent] * len(embeddings))
+
+        # Seeds are embedded in the collection's document format so they live in the same space
+        for intent, texts in SEED_EXAMPLES.items():
+            vectors.append(np.asarray(self.rag_manager.embedding_func([f"Input: {text}." for text in texts]), dtype=np.float32))
+            labels.extend([intent] * len(texts))
+
+        self._intents = sorted(set(labels))
+        intent_ids = {intent: i for i, intent in enumerate(self._intents)}
+        self._vectors = self._normalize(np.vstack(vectors))
+        self._labels = np.array([intent_ids[label] for label in labels], dtype=np.int32)
+        print(f"Intent classifier ready: {len(self._labels)} labeled vectors ({', '.join(self._intents)}).")
+
+    def _ensure_index(self):
+        # Rebuilt after every DB sync (RAGManager bumps data_version when the collection changes)
+        version = self.rag_manager.data_version
+        if self._vectors is None or self._data_version != version:
+            with self._lock:
+                if self._vectors is None or self._data_version != version:
+                    self._build_index()
+                    self._data_version = version
+
+    def classify(self, text):
+        """
+        Returns (intent, confidence, top_similarity) for a user message.
+        confidence is the similarity-weighted vote share of the winning intent among the k neighbours.
+        """
+        self._ensure_index()
+        query = self._normalize(self.rag_manager.embed_queries([text]))[0]
+        similarities = self._vectors @ query
+
+        k = min(self.k, len(similarities))
+        top = np.argpartition(-similarities, k - 1)[:k]
+        weights = np.clip(similarities[top], 0.0, None)
+        votes = np.bincount(self._labels[top], weights=weights, minlength=len(self._intents))
+        total = votes.sum()
+        if total <= 0:
+            return None, 0.0, float(similarities[top].max())
+
+        winner = int(votes.argmax())
+        return self._intents[winner], float(votes[winner] / total), float(similarities[top].max())
+
+    def local_response(self, text):
+        """
+        Returns (intent, canned_response) when the message can be answered without the LLM,
+        otherwise (intent, None). intent is None when the vote is not confident enough to act on.
+        """
+        intent, confidence, similarity = self.classify(text)
+        if confidence < self.min_confidence or similarity < self.min_similarity:
+            return None, None
+        if intent in LOCAL_INTENTS:
+            return intent, CANNED_RESPONSES[intent]
+        return intent, None
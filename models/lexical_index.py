@@ -0,0 +1,79 @@
+import math
+import re
+import numpy as np
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+# Dotted and dotless I are folded to one "i" (index and query alike), so English "I" -> "i"
+# and Turkish "IŞIK" / "ışık" / "işik" match each other; str.lower() alone would also turn
+# "İ" into "i̇" (two code points)
+_I_FOLD = str.maketrans({"İ": "i", "ı": "i"})
+
+
+def tokenize(text):
+    return _TOKEN_PATTERN.findall(text.translate(_I_FOLD).lower())
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed list of short texts (user_input + style_tags of every RAG example).
+
+    The inverted index stores, per term, the matching row numbers and their precomputed
+    BM25 weight (idf x saturated tf), so scoring a query is one vectorized scatter-add per
+    query term into a score array.
+    """
+
+    def __init__(self, texts, k1=1.5, b=0.75):
+        self.size = len(texts)
+        postings = {}
+        lengths = np.zeros(self.size, dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[row] = len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                postings.setdefault(token, ([], []))
+                postings[token][0].append(row)
+                postings[token][1].append(tf)
+
+        avg_length = float(lengths.mean()) if self.size else 0.0
+        norm = k1 * (1 - b + b * lengths / avg_length) if avg_length else np.full(self.size, k1, dtype=np.float32)
+        self.postings = {}
+        for token, (rows, tfs) in postings.items():
+            rows = np.asarray(rows, dtype=np.int64)
+            tfs = np.asarray(tfs, dtype=np.float32)
+            idf = math.log(1 + (self.size - len(rows) + 0.5) / (len(rows) + 0.5))
+            self.postings[token] = (rows, (idf * tfs * (k1 + 1) / (tfs + norm[rows])).astype(np.float32))
+
+    def __len__(self):
+        return self.size
+
+    def scores(self, query):
+        """BM25 score of every row for the query (zeros for rows sharing no term)."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for token in set(tokenize(query)):
+            posting = self.postings.get(token)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+        return scores
+
+    @staticmethod
+    def top_k(scores, k, allowed=None):
+        """
+        (row indices, scores) of the k best rows of a scores() array that have a positive score
+        (and are set in the `allowed` mask), best first. `scores` is not modified, so callers
+        can score a query once and reuse the array.
+        """
+        positive = scores > 0
+        if allowed is not None:
+            positive &= allowed
+        matched = np.flatnonzero(positive)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched])]
+        return matched, scores[matched]
+
+    def search(self, query, k, allowed=None):
+        """Returns (row indices, scores) of the k best-matching rows with a positive score, best first."""
+        return self.top_k(self.scores(query), k, allowed)
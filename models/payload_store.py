@@ -0,0 +1,128 @@
+import os
+from models.versioned_store import VersionedFileStore
+
+
+class PayloadStore(VersionedFileStore):
+    """
+    Side store for the heavy per-example payloads (json_output), so Chroma metadata stays small.
+
+    Layout under `path` (see VersionedFileStore for the commit / compaction rules):
+        payloads[.N].bin - append-only UTF-8 blobs, back to back
+        index.json       - {"ids": [doc_id, ...], "offsets": [int, ...], "lengths": [int, ...],
+                            "file": str, "generation": int} ("file" names the current data file)
+        .lock            - inter-process lock for append / compact
+
+    Payloads are keyed by the Chroma document id and read with one seek per id, so a query only
+    loads the JSON of the examples it finally puts into the prompt.
+    """
+
+    file_prefix = "payloads"
+
+    def __init__(self, path="database/chroma_db_payloads"):
+        self.ids = []
+        self.locations = {}
+        # End of the indexed (or batch-staged) bytes; appends write from here
+        self._data_end = 0
+        super().__init__(path)
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self.ids)
+
+    def contains_all(self, doc_ids):
+        """True if every id has a payload (checked against the latest index on disk)."""
+        with self._lock:
+            self._refresh()
+            return all(doc_id in self.locations for doc_id in doc_ids)
+
+    def _load_index(self, index):
+        self.ids = index["ids"]
+        self.locations = {
+            doc_id: (offset, length)
+            for doc_id, offset, length in zip(index["ids"], index["offsets"], index["lengths"])
+        }
+        self._data_end = max((offset + length for offset, length in self.locations.values()), default=0)
+
+    def _index_fields(self):
+        return {
+            "ids": self.ids,
+            "offsets": [self.locations[doc_id][0] for doc_id in self.ids],
+            "lengths": [self.locations[doc_id][1] for doc_id in self.ids]
+        }
+
+    def get(self, doc_ids):
+        """Returns {doc_id: payload} for the ids present in the store."""
+        with self._lock:
+            self._refresh()
+            wanted = sorted(
+                ((self.locations[doc_id], doc_id) for doc_id in set(doc_ids) if doc_id in self.locations)
+            )
+            if not wanted:
+                return {}
+            try:
+                return self._read(wanted)
+            except FileNotFoundError:
+                # Another process compacted the store between our index check and the open
+                self._load()
+                return self._read(
+                    sorted((self.locations[doc_id], doc_id) for _, doc_id in wanted if doc_id in self.locations)
+                )
+
+    def _read(self, wanted):
+        payloads = {}
+        # Reads in file order, so a batch of ids is one forward pass over the file
+        with open(self.data_path, "rb") as f:
+            for (offset, length), doc_id in wanted:
+                f.seek(offset)
+                payloads[doc_id] = f.read(length).decode("utf-8")
+        return payloads
+
+    def append(self, doc_ids, payloads):
+        """Appends new payloads; ids already in the store are skipped (ids are content hashes)."""
+        with self._write_lock():
+            self._refresh()
+            fresh = {}
+            for doc_id, payload in zip(doc_ids, payloads):
+                if doc_id not in self.locations and doc_id not in fresh:
+                    fresh[doc_id] = payload.encode("utf-8")
+            if not fresh:
+                return
+            os.makedirs(self.path, exist_ok=True)
+            # Write right after the indexed (or batch-staged) bytes
+            offset = self._data_end
+            written = []
+            with open(self.data_path, "r+b" if os.path.exists(self.data_path) else "wb") as f:
+                f.seek(offset)
+                for doc_id, blob in fresh.items():
+                    f.write(blob)
+                    written.append((doc_id, offset, len(blob)))
+                    offset += len(blob)
+                f.truncate()
+            for doc_id, blob_offset, length in written:
+                self.locations[doc_id] = (blob_offset, length)
+                self.ids.append(doc_id)
+            self._data_end = offset
+            self._commit()
+
+    def compact(self, live_ids):
+        """Rewrites the store keeping only `live_ids` (drops payloads of removed documents)."""
+        with self._write_lock():
+            self._refresh()
+            kept = [doc_id for doc_id in self.ids if doc_id in live_ids]
+            if len(kept) == len(self.ids):
+                return
+            new_file = self._next_data_file()
+            locations = {}
+            with open(self.data_path, "rb") as src, open(os.path.join(self.path, new_file), "wb") as dst:
+                for doc_id in kept:
+                    offset, length = self.locations[doc_id]
+                    src.seek(offset)
+                    locations[doc_id] = (dst.tell(), length)
+                    dst.write(src.read(length))
+                data_end = dst.tell()
+            self.ids = kept
+            self.locations = locations
+            self._data_end = data_end
+            self._switch_data_file(new_file)
+            print(f"Payload store compacted to {len(kept)} payloads.")
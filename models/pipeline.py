@@ -0,0 +1,235 @@
+import asyncio
+import functools
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from models.intent_classifier import COLLECTION_INTENTS
+from utils.helpers import JSONStreamExtractor
+from utils.metrics import metrics
+
+
+_background_loop = None
+_background_loop_lock = threading.Lock()
+
+
+def get_background_loop():
+    """
+    Returns the process-wide event loop (started on first use in a daemon thread) that every
+    ChatPipeline's sync bridge runs on. Pooled engines create their async HTTP clients on the
+    first loop that uses them, and those clients cannot be used from another loop, so all
+    pipelines (one per RAG manager / classifier setting) must share this single loop.
+    """
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(target=_background_loop.run_forever, name="chat-pipeline-loop", daemon=True).start()
+        return _background_loop
+
+
+class ChatPipeline:
+    """
+    Asyncio request pipeline for the chat path: RAG retrieval -> LLM -> JSON extraction.
+
+    Retrieval (CPU/SQLite bound) runs in a thread executor, LLM calls use the engines'
+    async clients, and every request shares one event loop, so many prompts can be in
+    flight at once through the same RAGManager and engines. Synchronous callers
+    (Streamlit, scripts) use run() / iterate(), which submit work to the process-wide background loop.
+
+    With an intent_classifier, greetings and out-of-scope messages are answered locally
+    (canned response, no retrieval and no LLM call). With a semantic_cache, a request that is
+    a near-duplicate of an earlier one (same model) reuses that request's JSON answer.
+
+    Results are dicts: {"context_examples": [...], "response": str, "json_data": dict or None,
+    "intent": str or None, "local": bool, "semantic_match": str or None}.
+    """
+
+    def __init__(self, rag_manager=None, retrieval_workers=4, intent_classifier=None, semantic_cache=None):
+        self.rag_manager = rag_manager
+        self.intent_classifier = intent_classifier
+        # Needs the RAG manager's embedding function; ignored without one
+        self.semantic_cache = semantic_cache if rag_manager else None
+        self._executor = ThreadPoolExecutor(max_workers=retrieval_workers, thread_name_prefix="rag-retrieval")
+
+    # --- async API ---
+
+    async def retrieve(self, prompt, intent=None):
+        """
+        RAG examples for the prompt. A confident collection intent from the classifier
+        restricts retrieval to examples of that intent (unfiltered if none match).
+        """
+        if not self.rag_manager:
+            return []
+        loop = asyncio.get_running_loop()
+        if intent in COLLECTION_INTENTS:
+            examples = await loop.run_in_executor(
+                self._executor, functools.partial(self.rag_manager.query_db, prompt, intent=intent)
+            )
+            if examples:
+                return examples
+        return await loop.run_in_executor(self._executor, self.rag_manager.query_db, prompt)
+
+    async def retrieve_many(self, prompts):
+        """Retrieval for many prompts in one batched embedding pass / Chroma query."""
+        if not self.rag_manager:
+            return [[] for _ in prompts]
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.rag_manager.query_db_batch, list(prompts))
+
+    async def classify(self, prompt):
+        """Returns (intent, canned_response or None). (None, None) without a classifier or on failure."""
+        if not self.intent_classifier:
+            return None, None
+        loop = asyncio.get_running_loop()
+        try:
+            with metrics.timer("intent_classify_seconds"):
+                return await loop.run_in_executor(self._executor, self.intent_classifier.local_response, prompt)
+        except Exception as e:
+            print(f"Intent classification failed, falling back to the LLM: {e}")
+            return None, None
+
+    def _semantic_lookup(self, model, prompt):
+        # The query embedding is cached by the RAG manager, so retrieval afterwards reuses it
+        vector = self.rag_manager.embed_queries([prompt])[0]
+        return self.semantic_cache.get(model, vector), vector
+
+    async def _shortcut(self, prompt, engine, use_semantic_cache):
+        """
+        Answers without the LLM when possible. Returns (intent, result or None, query vector or None);
+        the vector is handed back so a fresh answer can be stored in the semantic cache.
+        """
+        intent, canned = await self.classify(prompt)
+        if canned:
+            return intent, self._result([], canned, None, intent, local=True), None
+        if not (self.semantic_cache and use_semantic_cache):
+            return intent, None, None
+
+        loop = asyncio.get_running_loop()
+        try:
+            with metrics.timer("semantic_cache_lookup_seconds"):
+                hit, vector = await loop.run_in_executor(self._executor, self._semantic_lookup, engine.model, prompt)
+        except Exception as e:
+            print(f"Semantic cache lookup failed: {e}")
+            return intent, None, None
+        metrics.inc("semantic_cache_lookups_total", result="hit" if hit else "miss")
+        if hit:
+            response, _, matched_text = hit
+            extractor = JSONStreamExtractor()
+            return intent, self._result([], response, extractor.feed(response), intent, semantic_match=matched_text), None
+        return intent, None, vector
+
+    def _remember(self, engine, prompt, vector, result):
+        # Only generated JSON prompts are reused; explanations and error strings are not
+        if vector is not None and result["json_data"]:
+            self.semantic_cache.set(engine.model, prompt, vector, result["response"])
+
+    @staticmethod
+    def _observe_request(start, result):
+        path = "local" if result["local"] else "semantic_cache" if result["semantic_match"] else "llm"
+        metrics.observe("pipeline_request_seconds", time.perf_counter() - start, path=path)
+
+    @staticmethod
+    def _result(context_examples, response, json_data, intent, local=False, semantic_match=None):
+        return {
+            "context_examples": context_examples,
+            "response": response,
+            "json_data": json_data,
+            "intent": intent,
+            "local": local,
+            "semantic_match": semantic_match
+        }
+
+    async def process(self, prompt, engine, context_examples=None, use_semantic_cache=True):
+        """Runs one prompt end to end. Pass context_examples to skip retrieval."""
+        start = time.perf_counter()
+        intent, shortcut, vector = await self._shortcut(prompt, engine, use_semantic_cache)
+        if shortcut:
+            self._observe_request(start, shortcut)
+            return shortcut
+        if context_examples is None:
+            context_examples = await self.retrieve(prompt, intent)
+        response = await engine.agenerate_response(prompt, context_examples)
+        extractor = JSONStreamExtractor()
+        result = self._result(context_examples, response, extractor.feed(response), intent)
+        self._remember(engine, prompt, vector, result)
+        self._observe_request(start, result)
+        return result
+
+    async def stream(self, prompt, engine, use_semantic_cache=True):
+        """
+        Async generator of pipeline events:
+            ("context", context_examples), ("chunk", text)..., ("done", result dict)
+        """
+        start = time.perf_counter()
+        intent, shortcut, vector = await self._shortcut(prompt, engine, use_semantic_cache)
+        if shortcut:
+            self._observe_request(start, shortcut)
+            yield "context", []
+            yield "chunk", shortcut["response"]
+            yield "done", shortcut
+            return
+
+        context_examples = await self.retrieve(prompt, intent)
+        yield "context", context_examples
+
+        extractor = JSONStreamExtractor()
+        chunks = []
+        async for chunk in engine.agenerate_response_stream(prompt, context_examples):
+            chunks.append(chunk)
+            extractor.feed(chunk)
+            yield "chunk", chunk
+
+        result = self._result(context_examples, "".join(chunks), extractor.result, intent)
+        self._remember(engine, prompt, vector, result)
+        self._observe_request(start, result)
+        yield "done", result
+
+    async def process_many(self, prompts, engine, concurrency=16, use_semantic_cache=True):
+        """
+        Pushes many prompts through the pipeline. Retrieval for all prompts is done in one
+        batched call; LLM calls then run with at most `concurrency` in flight. Order is kept.
+        """
+        all_examples = await self.retrieve_many(prompts)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run_one(prompt, context_examples):
+            async with semaphore:
+                return await self.process(prompt, engine, context_examples, use_semantic_cache)
+
+        return await asyncio.gather(*(run_one(p, ex) for p, ex in zip(prompts, all_examples)))
+
+    # --- sync bridge ---
+
+    def _ensure_loop(self):
+        return get_background_loop()
+
+    def run(self, coro):
+        """Runs a coroutine on the shared background loop and blocks until it finishes."""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop()).result()
+
+    def iterate(self, agen):
+        """Consumes an async generator on the shared background loop as a normal (sync) generator."""
+        items = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    items.put(item)
+            except BaseException as e:
+                items.put(e)
+            else:
+                items.put(done)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._ensure_loop())
+        try:
+            while True:
+                item = items.get()
+                if item is done:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
@@ -0,0 +1,82 @@
+import textwrap
+
+# Static instructions shared by every engine. Compiled (dedented) once at import time so
+# every request sends a byte-identical prefix, which is what provider-side prompt caching
+# (xAI prefix caching, Gemini cached content) keys on.
+SYSTEM_PROMPT = textwrap.dedent("""
+        Sen "StableGen Assistant" adında bir yapay zeka asistanısın.
+        Görevin: Kullanıcıların metin tabanlı fikirlerini Stable Diffusion için optimize edilmiş JSON formatına dönüştürmek veya teknik konularda bilgi vermek.
+        
+        KURALLAR:
+        1. Eğer kullanıcı bir görsel, resim, çizim veya sahne tasviri istiyorsa (Niyet: generate_json):
+           - SADECE geçerli bir JSON objesi döndür.
+           - Markdown blokları (```json ... ```) KULLANMA.
+           - ÖNCELİK: Eğer RAG Context içinde (Referans Örnekler) kullanıcı isteğine benzer karmaşık bir JSON yapısı (blueprint, scene_graph, actors vb.) varsa, MUTLAKA o yapıyı ve detay seviyesini takip et.
+           - Eğer RAG'dan özel bir yapı gelmezse bile varsayılan yapıyı zenginleştir. Sadece `positive_prompt` değil, `scene_description`, `lighting`, `camera_settings` gibi alt alanlar ekle.
+           
+           Örnek Zengin Yapı (Eğer RAG'da yoksa bunu kullan):
+           {
+             "scene": {
+               "description": "Detaylı sahne açıklaması...",
+               "mood": "Atmosfer ve duygu...",
+               "lighting": "Işıklandırma detayları..."
+             },
+             "subject": {
+               "description": "Ana obje/karakter detayları...",
+               "pose": "Duruş veya pozisyon..."
+             },
+             "technical": {
+               "camera": "Lens ve kamera tipi...",
+               "style": "Sanat stili (örn: fotorealistik, yağlı boya)..."
+             },
+             "generation_params": {
+               "positive_prompt": "Tüm detayların birleştiği ana prompt...",
+               "negative_prompt": "İstenmeyen özellikler...",
+               "cfg_scale": 7.0,
+               "steps": 30,
+               "sampler": "Euler a"
+             }
+           }
+           - Positive prompt içine RAG ile gelen stil önerilerini veya kullanıcının istediği stili yedir.
+        
+        2. Eğer kullanıcı teknik bir terim soruyor veya sohbet ediyorsa (Niyet: explain_term / greeting):
+           - Normal, açıklayıcı bir metin (String) olarak cevap ver.
+           - JSON döndürme.
+           
+        3. Asla yorum satırı ekleme, sadece istenen formatı ver.
+        """).strip()
+
+RAG_EXAMPLE_PREFIX = "Örnek Bağlam (RAG): "
+RAG_SECTION_HEADER = "REFERANS ALINACAK BAŞARILI ÖRNEKLER (RAG Context):\n"
+USER_INPUT_MARKER = "KULLANICI İSTEĞİ: "
+
+# Stable prefix of the single-string (Gemini) prompt; everything after it changes per request
+PROMPT_PREFIX = SYSTEM_PROMPT + "\n\n"
+
+_SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+
+def build_messages(user_input, context_examples=None):
+    """
+    Chat-format prompt (OpenAI-compatible): static system message, one user message per
+    RAG example, then the user input. The system message dict is shared; do not mutate it.
+    """
+    messages = [_SYSTEM_MESSAGE]
+    if context_examples:
+        messages.extend({"role": "user", "content": RAG_EXAMPLE_PREFIX + example} for example in context_examples)
+    messages.append({"role": "user", "content": user_input})
+    return messages
+
+def build_dynamic_section(user_input, context_examples=None):
+    """Per-request part of the single-string prompt (RAG examples + user input), built with one join."""
+    parts = []
+    if context_examples:
+        parts.append(RAG_SECTION_HEADER)
+        parts.extend(f"- {example}\n" for example in context_examples)
+        parts.append("\n")
+    parts.append(USER_INPUT_MARKER)
+    parts.append(user_input)
+    return "".join(parts)
+
+def build_prompt(user_input, context_examples=None):
+    """Single-string prompt: cached static prefix + dynamic section."""
+    return PROMPT_PREFIX + build_dynamic_section(user_input, context_examples)
@@ -2,15 +2,44 @@ import chromadb
 import pandas as pd
 import os
 import json
+import hashlib
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from sklearn.model_selection import train_test_split
-from chromadb.utils import embedding_functions
+from models.embedding_store import EmbeddingStore, LazyEmbeddingFunction
+from models.lexical_index import BM25Index
+from models.payload_store import PayloadStore
+from models.vector_index import VECTOR_BACKENDS, build_index
+from utils.cache import LRUCache
+from utils.context_packing import compact_json, estimate_tokens, example_tokens, format_example, select_examples
+from utils.data_loader import SOURCE_COLUMNS, count_source_rows, iter_source_chunks, read_source_columns
+from utils.metrics import metrics
+
+RETRIEVAL_MODES = ("dense", "hybrid")
+
 
 class RAGManager:
-    def __init__(self, excel_path="data/sd_prompts.xlsx", db_path="database/chroma_db", test_data_path="data/test_set.json"):
+    def __init__(self, excel_path="data/sd_prompts.xlsx", db_path="database/chroma_db", test_data_path="data/test_set.json",
+                 chunk_size=1000, embed_batch_size=128, write_batch_size=1000, embed_workers=None,
+                 embedding_store_path="database/embeddings", embedding_dtype="float32", query_cache_size=1024,
+                 embedding_function=None, context_token_budget=1200, candidate_multiplier=3, use_columnar_cache=True,
+                 vector_backend=None, ivf_n_probe=8, exact_max_rows=50000, retrieval_mode=None, hybrid_alpha=0.7,
+                 payload_store_path=None, columnar_cache_dir=None, auto_initialize=True):
         self.excel_path = excel_path
         self.db_path = db_path
         self.test_data_path = test_data_path
         self.collection_name = "stable_diffusion_prompts"
+
+        # Ingestion settings: rows read per chunk, texts per embedding call, records per Chroma write
+        self.chunk_size = chunk_size
+        self.embed_batch_size = embed_batch_size
+        self.write_batch_size = write_batch_size
+        self.embed_workers = embed_workers or os.cpu_count() or 1
+        # Read the sheet through its Parquet copy (converted once, refreshed when the xlsx changes),
+        # kept next to db_path unless a directory is given
+        self.use_columnar_cache = use_columnar_cache
+        self.columnar_cache_dir = columnar_cache_dir or os.path.join(os.path.dirname(self.db_path), "columnar")
         
         # Ensure database directory exists
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
@@ -18,189 +47,643 @@ class RAGManager:
         # Initialize client with persistence
         self.client = chromadb.PersistentClient(path=self.db_path)
         
-        # Use default embedding function (all-MiniLM-L6-v2)
-        self.embedding_func = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name="all-MiniLM-L6-v2"
-        )
+        # Use default embedding model (all-MiniLM-L6-v2), loaded on first use only.
+        # A custom embedding function can be injected (e.g. a stub for benchmarks).
+        self.embedding_func = embedding_function or LazyEmbeddingFunction(model_name="all-MiniLM-L6-v2")
+
+        # Precomputed document vectors (memory-mapped); a fresh db_path is populated from here without re-embedding
+        self.embedding_store = EmbeddingStore(path=embedding_store_path, dtype=embedding_dtype)
+
+        # json_output lives in a side store keyed by document id; metadata only keeps its token estimate
+        self.payload_store = PayloadStore(path=payload_store_path or self.db_path.rstrip("/\\") + "_payloads")
+
+        # Hot-path caches: query text -> embedding, (data_version, query text, n_results, filters) -> formatted examples
+        self._query_embedding_cache = LRUCache(max_size=query_cache_size)
+        self._query_result_cache = LRUCache(max_size=query_cache_size)
+        # Bumped whenever the collection may have changed; derived indexes (e.g. IntentClassifier) rebuild on change
+        self.data_version = 0
+
+        # RAG context packing: examples are compacted and chosen to fit this many (estimated) tokens.
+        # candidate_multiplier x n_results hits are retrieved so smaller examples can replace oversized ones.
+        self.context_token_budget = context_token_budget
+        self.candidate_multiplier = candidate_multiplier
+
+        # Retrieval backend: "chroma" (collection.query) or an in-process NumPy index built from the
+        # collection: "exact" (brute-force top-k), "ivf" (approximate) or "auto" (exact up to exact_max_rows)
+        self.vector_backend = vector_backend or os.getenv("RAG_VECTOR_BACKEND", "chroma")
+        if self.vector_backend not in VECTOR_BACKENDS:
+            raise ValueError(f"Unknown vector backend: {self.vector_backend} (choose from {VECTOR_BACKENDS})")
+        self.ivf_n_probe = ivf_n_probe
+        self.exact_max_rows = exact_max_rows
+        # "dense" (vector only) or "hybrid" (vector + BM25 over user_input / style_tags); per-call override in query_db
+        self.retrieval_mode = retrieval_mode or os.getenv("RAG_RETRIEVAL_MODE", "dense")
+        if self.retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {self.retrieval_mode} (choose from {RETRIEVAL_MODES})")
+        self.hybrid_alpha = hybrid_alpha
+        # In-memory corpus (ids, metadata, vector / BM25 indexes), rebuilt after every sync
+        self._corpus = None
+        self._corpus_version = None
+        self._corpus_lock = threading.RLock()
+        self._fingerprint = None
+        self._fingerprint_version = None
+
+        # The manager is shared across sessions/threads; only one sync may run at a time
+        self._sync_lock = threading.Lock()
         
         self.collection = self.client.get_or_create_collection(
             name=self.collection_name,
             embedding_function=self.embedding_func
         )
         
-        # Initialize DB if empty
-        if self.collection.count() == 0:
+        # auto_initialize=False: offline build steps (e.g. the embedding store) that must not fill the collection
+        if not auto_initialize:
+            return
+
+        # Initialize DB if empty (or if its payloads are missing, e.g. a collection from before the payload store)
+        if self.collection.count() == 0 or not len(self.payload_store):
             self.initialize_db()
 
-    def initialize_db(self):
-        """Loads data from Excel, splits into Train/Test, and populates the vector database with Train set."""
-        if not os.path.exists(self.excel_path):
-            print(f"Warning: Excel file not found at {self.excel_path}")
-            return False
+        # Build the in-process indexes up front so the first query does not pay for them
+        if self.vector_backend != "chroma" or self.retrieval_mode == "hybrid":
+            corpus = self._ensure_corpus()
+            if self.retrieval_mode == "hybrid":
+                self._lexical_index(corpus)
 
+    @staticmethod
+    def _row_id(user_input, intent, style_tags, json_output):
+        """Content-hash id of a row: stable across reorders, changes whenever the row content changes."""
+        content = "\x1f".join([user_input, intent, style_tags, json_output])
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def _max_write_batch(self):
+        """Chroma rejects writes above the client's max batch size, so never exceed it."""
         try:
-            df = pd.read_excel(self.excel_path)
+            return max(1, min(self.write_batch_size, self.client.get_max_batch_size()))
+        except Exception:
+            return self.write_batch_size
+
+    def _ensure_test_set(self):
+        """
+        Returns the set of user inputs reserved for the test set.
+        If data/test_set.json does not exist yet, it is created from the Excel source first.
+        """
+        # --- TEST SETİ MANTIĞI ---
+        # Eğer test_set.json ZATEN VARSA ve doluysa, onu koru.
+        # Veritabanına sadece bu test setinde OLMAYAN verileri yükle.
+        if os.path.exists(self.test_data_path):
+            try:
+                with open(self.test_data_path, 'r', encoding='utf-8') as f:
+                    existing_test_data = json.load(f)
+                if len(existing_test_data) > 0:
+                    print(f"Existing test set found ({len(existing_test_data)} samples). Protecting it.")
+                    return {item['text'] for item in existing_test_data}
+            except:
+                pass
+
+        # Test seti yoksa OLUŞTUR (İlk sefer). Split needs the whole sheet, but only once.
+        print("No existing test set found. Creating new one with Extended Cases...")
+        df = pd.DataFrame(read_source_columns(
+            self.excel_path, SOURCE_COLUMNS, self.use_columnar_cache, self.columnar_cache_dir
+        ))
+        
+        manual_hard_test_cases = [
+            # 1. Çeldirici: "Prompt" kelimesi geçen sorular (Intent: explain_term / text)
+            {"user_input": "Prompt mühendisliği nedir?", "intent": "explain_term"},
+            {"user_input": "Bana prompt üretme, sadece saati söyle.", "intent": "unknown"},
+            {"user_input": "Json çıktısı nasıl görünür?", "intent": "explain_term"},
             
-            # --- TEST SETİ MANTIĞI ---
-            # Eğer test_set.json ZATEN VARSA ve doluysa, onu koru.
-            # Veritabanına sadece bu test setinde OLMAYAN verileri yükle.
+            # 2. Çeldirici: Görsel isteği ama çok soyut/negatif (Intent: generate_json)
+            {"user_input": "Hiçbir şeyin olmadığı bir boşluk çiz.", "intent": "generate_json"},
+            {"user_input": "Bana hüzünlü bir şarkı gibi hissettiren bir resim yap.", "intent": "generate_json"},
             
-            test_data_exists = False
-            if os.path.exists(self.test_data_path):
-                try:
-                    with open(self.test_data_path, 'r', encoding='utf-8') as f:
-                        existing_test_data = json.load(f)
-                        if len(existing_test_data) > 0:
-                            test_data_exists = True
-                            print(f"Existing test set found ({len(existing_test_data)} samples). Protecting it.")
-                except:
-                    pass
-
-            if test_data_exists:
-                # Test setindeki soruları ana veriden çıkar (Basit eşleşme ile)
-                test_texts = [item['text'] for item in existing_test_data]
-                train_df = df[~df['user_input'].isin(test_texts)]
-                
-                print(f"Using existing Test Set. Train Data: {len(train_df)} samples loaded to DB.")
-                
-            else:
-                # Test seti yoksa OLUŞTUR (İlk sefer)
-                print("No existing test set found. Creating new one with Extended Cases...")
-                
-                manual_hard_test_cases = [
-                    # 1. Çeldirici: "Prompt" kelimesi geçen sorular (Intent: explain_term / text)
-                    {"user_input": "Prompt mühendisliği nedir?", "intent": "explain_term"},
-                    {"user_input": "Bana prompt üretme, sadece saati söyle.", "intent": "unknown"},
-                    {"user_input": "Json çıktısı nasıl görünür?", "intent": "explain_term"},
-                    
-                    # 2. Çeldirici: Görsel isteği ama çok soyut/negatif (Intent: generate_json)
-                    {"user_input": "Hiçbir şeyin olmadığı bir boşluk çiz.", "intent": "generate_json"},
-                    {"user_input": "Bana hüzünlü bir şarkı gibi hissettiren bir resim yap.", "intent": "generate_json"},
-                    
-                    # 3. Selamlama / Sohbet (Intent: greeting)
-                    {"user_input": "Merhaba, nasılsın?", "intent": "greeting"},
-                    {"user_input": "Selam, bugün hava nasıl?", "intent": "greeting"},
-                    {"user_input": "Günaydın!", "intent": "greeting"},
-                    
-                    # 4. Vedalaşma (Intent: greeting / farewell)
-                    {"user_input": "Görüşürüz, kendine iyi bak.", "intent": "greeting"},
-                    {"user_input": "Baybay", "intent": "greeting"},
-                    {"user_input": "Çıkış yapıyorum.", "intent": "greeting"},
-                    
-                    # 5. Reddetme / Olumsuz Emirler (Intent: unknown veya greeting)
-                    {"user_input": "Hayır, bunu istemiyorum.", "intent": "unknown"},
-                    {"user_input": "Vazgeçtim, yapma.", "intent": "unknown"},
-                    {"user_input": "Kötü cevap verdin.", "intent": "unknown"},
-                    
-                    # 6. Sepet / Ürün İşlemleri (E-Ticaret Senaryoları - Kapsam Dışı / unknown)
-                    {"user_input": "Bu ürünü sepete ekle.", "intent": "unknown"},
-                    {"user_input": "Siparişim nerede kaldı?", "intent": "unknown"},
-                    {"user_input": "Ürünü iade etmek istiyorum.", "intent": "unknown"},
-                    {"user_input": "Fiyatı ne kadar?", "intent": "unknown"},
-                    
-                    # 7. Konuya Özgü Teknik Sorular (Intent: explain_term)
-                    {"user_input": "Seed -1 ne demek?", "intent": "explain_term"},
-                    {"user_input": "Negative prompt ne işe yarar?", "intent": "explain_term"},
-                    
-                    # 8. Normal Görsel İstekleri (Intent: generate_json)
-                    {"user_input": "Kırmızı araba", "intent": "generate_json"},
-                    {"user_input": "Uzayda süzülen astronot", "intent": "generate_json"}
-                ]
-                
-                # Mevcut veriden %5 rastgele al, üzerine zor örnekleri ekle
-                train_df, random_test_df = train_test_split(df, test_size=0.05, random_state=42)
-                
-                # DataFrame formatına çevir
-                hard_test_df = pd.DataFrame(manual_hard_test_cases)
-                
-                # Test seti = Rastgele %5 + Yeni Manuel Örnekler
-                final_test_df = pd.concat([random_test_df, hard_test_df], ignore_index=True)
-                
-                # Save Test Data for Evaluation
-                test_data_list = []
-                for _, row in final_test_df.iterrows():
-                    test_data_list.append({
-                        "text": str(row['user_input']),
-                        "expected_intent": str(row['intent'])
-                    })
-                
-                with open(self.test_data_path, 'w', encoding='utf-8') as f:
-                    json.dump(test_data_list, f, indent=2, ensure_ascii=False)
-                print(f"New Test Data saved to {self.test_data_path} with {len(test_data_list)} samples.")
-
-            # Populate ChromaDB with ONLY Train Data
-            ids = [str(i) for i in range(len(train_df))] # Re-index IDs
-            documents = []
-            metadatas = []
+            # 3. Selamlama / Sohbet (Intent: greeting)
+            {"user_input": "Merhaba, nasılsın?", "intent": "greeting"},
+            {"user_input": "Selam, bugün hava nasıl?", "intent": "greeting"},
+            {"user_input": "Günaydın!", "intent": "greeting"},
             
-            for _, row in train_df.iterrows():
-                doc_text = f"Input: {row['user_input']}. Style: {row.get('style_tags', '')}"
-                documents.append(doc_text)
-                
-                meta = {
-                    "user_input": str(row['user_input']),
-                    "intent": str(row['intent']),
-                    "style_tags": str(row.get('style_tags', '')),
-                    "json_output": str(row['json_output'])
-                }
-                metadatas.append(meta)
-
-            if documents:
-                self.collection.add(
-                    ids=ids,
-                    documents=documents,
-                    metadatas=metadatas
-                )
-                print(f"Successfully added {len(documents)} documents to ChromaDB (Train Set).")
-                return True
+            # 4. Vedalaşma (Intent: greeting / farewell)
+            {"user_input": "Görüşürüz, kendine iyi bak.", "intent": "greeting"},
+            {"user_input": "Baybay", "intent": "greeting"},
+            {"user_input": "Çıkış yapıyorum.", "intent": "greeting"},
+            
+            # 5. Reddetme / Olumsuz Emirler (Intent: unknown veya greeting)
+            {"user_input": "Hayır, bunu istemiyorum.", "intent": "unknown"},
+            {"user_input": "Vazgeçtim, yapma.", "intent": "unknown"},
+            {"user_input": "Kötü cevap verdin.", "intent": "unknown"},
+            
+            # 6. Sepet / Ürün İşlemleri (E-Ticaret Senaryoları - Kapsam Dışı / unknown)
+            {"user_input": "Bu ürünü sepete ekle.", "intent": "unknown"},
+            {"user_input": "Siparişim nerede kaldı?", "intent": "unknown"},
+            {"user_input": "Ürünü iade etmek istiyorum.", "intent": "unknown"},
+            {"user_input": "Fiyatı ne kadar?", "intent": "unknown"},
+            
+            # 7. Konuya Özgü Teknik Sorular (Intent: explain_term)
+            {"user_input": "Seed -1 ne demek?", "intent": "explain_term"},
+            {"user_input": "Negative prompt ne işe yarar?", "intent": "explain_term"},
+            
+            # 8. Normal Görsel İstekleri (Intent: generate_json)
+            {"user_input": "Kırmızı araba", "intent": "generate_json"},
+            {"user_input": "Uzayda süzülen astronot", "intent": "generate_json"}
+        ]
+        
+        # Mevcut veriden %5 rastgele al, üzerine zor örnekleri ekle
+        _, random_test_df = train_test_split(df, test_size=0.05, random_state=42)
+        
+        # DataFrame formatına çevir
+        hard_test_df = pd.DataFrame(manual_hard_test_cases)
+        
+        # Test seti = Rastgele %5 + Yeni Manuel Örnekler
+        final_test_df = pd.concat([random_test_df, hard_test_df], ignore_index=True)
+        
+        # Save Test Data for Evaluation
+        test_data_list = [
+            {"text": str(user_input), "expected_intent": str(intent)}
+            for user_input, intent in zip(final_test_df['user_input'], final_test_df['intent'])
+        ]
+        
+        with open(self.test_data_path, 'w', encoding='utf-8') as f:
+            json.dump(test_data_list, f, indent=2, ensure_ascii=False)
+        print(f"New Test Data saved to {self.test_data_path} with {len(test_data_list)} samples.")
+        return {item['text'] for item in test_data_list}
+
+    def _embed_documents(self, documents, executor):
+        """
+        Returns embeddings for documents, preserving order.
+        Vectors found in the embedding store are reused; the rest are embedded in fixed-size
+        batches spread over the worker pool and appended to the store.
+        """
+        keys = [EmbeddingStore.doc_key(doc) for doc in documents]
+        stored = self.embedding_store.get(keys)
+        missing = [i for i, key in enumerate(keys) if key not in stored]
+
+        computed = {}
+        if missing:
+            missing_docs = [documents[i] for i in missing]
+            batches = [missing_docs[i:i + self.embed_batch_size] for i in range(0, len(missing_docs), self.embed_batch_size)]
+            vectors = []
+            for batch_embeddings in executor.map(self.embedding_func, batches):
+                vectors.extend(batch_embeddings)
+            missing_keys = [keys[i] for i in missing]
+            self.embedding_store.append(missing_keys, vectors)
+            computed = dict(zip(missing_keys, vectors))
+
+        return [
+            np.asarray(stored[key] if key in stored else computed[key], dtype=np.float32).tolist()
+            for key in keys
+        ]
+
+    def _iter_train_chunks(self, test_texts):
+        """
+        Streams the Excel source and yields one list of (id, document, metadata, json_output) per chunk,
+        skipping rows reserved for the test set.
+        """
+        seen_ids = set()
+        for chunk in iter_source_chunks(
+            self.excel_path, SOURCE_COLUMNS, self.chunk_size, self.use_columnar_cache, self.columnar_cache_dir
+        ):
+            records = []
+            for user_input, intent, style_tags, json_output in zip(
+                chunk["user_input"], chunk["intent"], chunk["style_tags"], chunk["json_output"]
+            ):
+                if user_input in test_texts:
+                    continue
+
+                row_id = self._row_id(user_input, intent, style_tags, json_output)
+                # Identical duplicate rows get an occurrence suffix so each keeps its own stable id
+                unique_id, n = row_id, 1
+                while unique_id in seen_ids:
+                    unique_id = f"{row_id}-{n}"
+                    n += 1
+                seen_ids.add(unique_id)
+
+                records.append((unique_id, f"Input: {user_input}. Style: {style_tags}", {
+                    "user_input": user_input,
+                    "intent": intent,
+                    "style_tags": style_tags,
+                    "example_tokens": example_tokens(user_input, json_output)
+                }, json_output))
+            yield records, len(chunk["user_input"])
+
+    def _sync_collection(self, test_texts, progress_callback=None):
+        """
+        Streams the Excel source chunk by chunk and diffs it against the collection.
+
+        Since ids are content hashes, an edited row shows up as one stale id (deleted)
+        and one new id (embedded and added); unchanged rows are never re-embedded.
+        Only the id sets are kept for the whole run, so memory does not grow with the sheet.
+        """
+        existing_ids = set(self.collection.get(include=[])["ids"])
+        rebuilt = False
+        if not self.payload_store.contains_all(existing_ids):
+            # Collections written before the payload store (json_output still in metadata): rebuild them
+            # so metadata shrinks; vectors come from the embedding store, so nothing is re-embedded.
+            print("Collection predates the payload store; rebuilding it with compact metadata.")
+            self.client.delete_collection(self.collection_name)
+            self.collection = self.client.get_or_create_collection(
+                name=self.collection_name,
+                embedding_function=self.embedding_func
+            )
+            existing_ids = set()
+            rebuilt = True
+        seen_ids = set()
+        live_doc_keys = set()
+        write_batch = self._max_write_batch()
+        total_rows = count_source_rows(self.excel_path, self.use_columnar_cache, self.columnar_cache_dir)
+        rows_done = added = 0
+
+        # Both side stores write their index once for the whole pass instead of after every chunk
+        with self.embedding_store.batch(), self.payload_store.batch():
+            with ThreadPoolExecutor(max_workers=self.embed_workers) as executor:
+                for records, chunk_rows in self._iter_train_chunks(test_texts):
+                    new_records = []
+                    for record in records:
+                        seen_ids.add(record[0])
+                        live_doc_keys.add(EmbeddingStore.doc_key(record[1]))
+                        if record[0] not in existing_ids:
+                            new_records.append(record)
+
+                    if new_records:
+                        ids = [record[0] for record in new_records]
+                        documents = [record[1] for record in new_records]
+                        metadatas = [record[2] for record in new_records]
+                        embeddings = self._embed_documents(documents, executor)
+                        # Payloads first, so every id in the collection can be resolved
+                        self.payload_store.append(ids, [record[3] for record in new_records])
+                        for start in range(0, len(ids), write_batch):
+                            end = start + write_batch
+                            self.collection.add(
+                                ids=ids[start:end],
+                                embeddings=embeddings[start:end],
+                                documents=documents[start:end],
+                                metadatas=metadatas[start:end]
+                            )
+                        added += len(ids)
+
+                    rows_done += chunk_rows
+                    if progress_callback:
+                        progress_callback(rows_done, total_rows)
+
+            removed_ids = list(existing_ids - seen_ids)
+            for start in range(0, len(removed_ids), write_batch):
+                self.collection.delete(ids=removed_ids[start:start + write_batch])
+
+            # Drop vectors of removed rows once they make up a noticeable part of the store
+            if len(self.embedding_store) > len(live_doc_keys) * 1.2:
+                self.embedding_store.compact(live_doc_keys)
+            if len(self.payload_store) > len(seen_ids) * 1.2:
+                self.payload_store.compact(seen_ids)
+
+        print(f"ChromaDB sync (Train Set): {added} added, {len(removed_ids)} removed, "
+              f"{len(seen_ids) - added} unchanged.")
+        # Cached results and in-memory indexes (data_version) stay valid when nothing changed
+        if added or removed_ids or rebuilt:
+            self._invalidate_query_cache()
+        return len(seen_ids) > 0
+
+    def build_embedding_store(self):
+        """
+        Build step: embeds every train document that is not in the embedding store yet and
+        compacts the store to exactly the current train set. Does not write to ChromaDB
+        (construct the manager with auto_initialize=False so the constructor does not sync it either).
+        """
+        if not os.path.exists(self.excel_path):
+            print(f"Warning: Excel file not found at {self.excel_path}")
             return False
-                
+
+        test_texts = self._ensure_test_set()
+        live_doc_keys = set()
+        with self.embedding_store.batch(), ThreadPoolExecutor(max_workers=self.embed_workers) as executor:
+            for records, _ in self._iter_train_chunks(test_texts):
+                documents = [record[1] for record in records]
+                live_doc_keys.update(EmbeddingStore.doc_key(doc) for doc in documents)
+                self._embed_documents(documents, executor)
+            self.embedding_store.compact(live_doc_keys)
+        print(f"Embedding store ready: {len(self.embedding_store)} vectors at {self.embedding_store.path}.")
+        return True
+
+    def initialize_db(self, progress_callback=None):
+        """
+        Loads data from Excel, splits into Train/Test, and syncs the vector database with the Train set.
+        On an empty collection this embeds every row; afterwards only added/changed/removed rows are touched.
+
+        Args:
+            progress_callback (callable): Called as progress_callback(rows_done, total_rows) after each chunk.
+                total_rows may be None if the sheet does not report its size.
+        """
+        if not os.path.exists(self.excel_path):
+            print(f"Warning: Excel file not found at {self.excel_path}")
+            return False
+
+        try:
+            with self._sync_lock:
+                test_texts = self._ensure_test_set()
+                # Sync ChromaDB with ONLY Train Data
+                return self._sync_collection(test_texts, progress_callback)
         except Exception as e:
             print(f"Error initializing database: {e}")
+            # A sync that failed halfway may still have written rows
+            self._invalidate_query_cache()
             return False
 
-    def refresh_db(self):
-        """Clears and reloads the database from Excel source."""
+    def refresh_db(self, progress_callback=None):
+        """Incrementally syncs the database with the Excel source (only changed rows are re-embedded)."""
         try:
             print("Refreshing database...")
-            # Delete existing collection
-            self.client.delete_collection(self.collection_name)
-            
-            # Recreate collection
-            self.collection = self.client.get_or_create_collection(
-                name=self.collection_name,
-                embedding_function=self.embedding_func
-            )
-            
-            # Repopulate
-            return self.initialize_db()
+            return self.initialize_db(progress_callback)
         except Exception as e:
             print(f"Error refreshing database: {e}")
             return False
 
-    def query_db(self, query_text, n_results=3):
-        """Retrieves most relevant examples for the query."""
+    def embed_queries(self, query_texts):
+        """
+        Returns one embedding per query text. Cached embeddings are reused; all
+        remaining texts are embedded together in a single model call.
+        """
+        embeddings = {text: self._query_embedding_cache.get(text) for text in set(query_texts)}
+        missing = [text for text, embedding in embeddings.items() if embedding is None]
+        if missing:
+            with metrics.timer("rag_embed_seconds"):
+                computed = self.embedding_func(missing)
+            metrics.observe("rag_embed_batch_size", len(missing))
+            for text, embedding in zip(missing, computed):
+                embedding = np.asarray(embedding, dtype=np.float32).tolist()
+                self._query_embedding_cache.set(text, embedding)
+                embeddings[text] = embedding
+        return [embeddings[text] for text in query_texts]
+
+    def retrieval_fingerprint(self):
+        """
+        Stable hash of the collection contents (ids are content hashes) and the retrieval settings.
+        Unlike data_version it is the same across processes, so it can key on-disk caches.
+        """
+        version = self.data_version
+        if self._fingerprint_version != version:
+            ids = sorted(self.collection.get(include=[])["ids"])
+            settings = [self.vector_backend, self.retrieval_mode, self.hybrid_alpha, self.context_token_budget,
+                        self.candidate_multiplier, self.ivf_n_probe if self.vector_backend in ("ivf", "auto") else None]
+            content = json.dumps([ids, settings])
+            self._fingerprint = hashlib.sha1(content.encode("utf-8")).hexdigest()
+            self._fingerprint_version = version
+        return self._fingerprint
+
+    def _invalidate_query_cache(self):
+        """Cached top-k results are only valid for the collection contents they were computed on."""
+        self._query_result_cache.clear()
+        self.data_version += 1
+
+    def _load_corpus(self, with_vectors, page_size=5000):
+        """
+        Loads ids/metadata of the whole collection (for the in-process vector index and/or BM25).
+        With with_vectors, vectors come from the embedding store (memmap), falling back to the
+        collection's stored embeddings for rows missing from the store.
+        """
+        metadatas, doc_keys, ids = [], [], []
+        offset = 0
+        while True:
+            page = self.collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            ids.extend(page["ids"])
+            metadatas.extend(page["metadatas"])
+            doc_keys.extend(EmbeddingStore.doc_key(doc) for doc in page["documents"])
+            offset += len(page["ids"])
+
+        corpus = {
+            "ids": ids,
+            "metadatas": metadatas,
+            "row_of_id": {doc_id: row for row, doc_id in enumerate(ids)},
+            "vector_index": None,
+            "lexical_index": None,
+            "filter_masks": LRUCache(max_size=64)
+        }
+        if not ids or not with_vectors:
+            return corpus
+
+        stored = self.embedding_store.get(doc_keys)
+        missing = [row for row, key in enumerate(doc_keys) if key not in stored]
+        fetched = {}
+        for start in range(0, len(missing), page_size):
+            rows = missing[start:start + page_size]
+            page = self.collection.get(ids=[ids[row] for row in rows], include=["embeddings"])
+            fetched.update(zip(page["ids"], page["embeddings"]))
+
+        dim = len(next(iter(stored.values()))) if stored else len(next(iter(fetched.values())))
+        vectors = np.empty((len(ids), dim), dtype=np.float32)
+        for row, key in enumerate(doc_keys):
+            vectors[row] = stored[key] if key in stored else fetched[ids[row]]
+
+        # `vectors` is our own copy (memmap rows were copied in above), so it is normalized in place
+        corpus["vector_index"] = build_index(
+            vectors, self.vector_backend, exact_max_rows=self.exact_max_rows, copy=False, n_probe=self.ivf_n_probe
+        )
+        print(f"Vector index ready: {type(corpus['vector_index']).__name__} over {len(ids)} vectors "
+              f"({len(ids) - len(missing)} from the embedding store).")
+        return corpus
+
+    def _ensure_corpus(self):
+        """Returns the in-memory corpus, rebuilding it after every DB sync (data_version change)."""
+        version = self.data_version
+        if self._corpus_version != version:
+            with self._corpus_lock:
+                if self._corpus_version != version:
+                    with metrics.timer("rag_index_build_seconds", backend=self.vector_backend):
+                        self._corpus = self._load_corpus(with_vectors=self.vector_backend != "chroma")
+                    self._corpus_version = version
+        return self._corpus
+
+    def _lexical_index(self, corpus):
+        """BM25 index over user_input + style_tags, built on first hybrid query per corpus."""
+        if corpus["lexical_index"] is None:
+            with self._corpus_lock:
+                if corpus["lexical_index"] is None:
+                    with metrics.timer("rag_lexical_index_build_seconds"):
+                        corpus["lexical_index"] = BM25Index([
+                            f"{meta.get('user_input', '')} {meta.get('style_tags', '')}" for meta in corpus["metadatas"]
+                        ])
+        return corpus["lexical_index"]
+
+    @staticmethod
+    def _normalize_filters(intent=None, style=None):
+        intents = (intent,) if isinstance(intent, str) else tuple(sorted(intent)) if intent else None
+        return intents, (style.strip().lower() or None) if style else None
+
+    def _filter_mask(self, corpus, intents, style):
+        """Boolean row mask for the metadata filters (None = no filter); cached per corpus."""
+        if not intents and not style:
+            return None
+        mask = corpus["filter_masks"].get((intents, style))
+        if mask is None:
+            mask = np.fromiter(
+                (
+                    (not intents or meta.get("intent") in intents)
+                    and (not style or style in str(meta.get("style_tags", "")).lower())
+                    for meta in corpus["metadatas"]
+                ),
+                dtype=bool, count=len(corpus["metadatas"])
+            )
+            corpus["filter_masks"].set((intents, style), mask)
+        return mask
+
+    def _chroma_query(self, query_embeddings, n_results, intents, style):
+        """Dense search through Chroma with the filters translated to where / where_document."""
+        kwargs = {}
+        if intents:
+            kwargs["where"] = {"intent": intents[0]} if len(intents) == 1 else {"intent": {"$in": list(intents)}}
+        results = self.collection.query(query_embeddings=query_embeddings, n_results=n_results, **kwargs)
+        hits = []
+        for ids, distances, metadatas in zip(results["ids"], results["distances"], results["metadatas"]):
+            # Style is a case-insensitive substring match on style_tags (same as the in-process filter)
+            kept = [
+                # Squared L2 between unit vectors -> cosine similarity
+                (doc_id, 1.0 - distance / 2, meta)
+                for doc_id, distance, meta in zip(ids, distances, metadatas)
+                if not style or style in str(meta.get("style_tags", "")).lower()
+            ]
+            hits.append(kept)
+        return hits
+
+    def _search(self, query_texts, query_embeddings, n_results, intents=None, style=None, hybrid=False):
+        """
+        Top-n (doc id, metadata) pairs per query from the configured backend, optionally filtered by intent / style.
+        In hybrid mode the dense candidates are merged with BM25 candidates and reranked by
+        hybrid_alpha * cosine + (1 - hybrid_alpha) * BM25 (scaled to the query's best BM25 score).
+        """
+        if self.vector_backend == "chroma":
+            # Over-fetch when style is post-filtered so enough hits survive
+            fetch = n_results * 3 if style else n_results
+            dense = self._chroma_query(query_embeddings, fetch, intents, style)
+            if not hybrid:
+                return [[(doc_id, meta) for doc_id, _, meta in hits[:n_results]] for hits in dense]
+            corpus = self._ensure_corpus()
+            dense_rows = [
+                [(corpus["row_of_id"][doc_id], score) for doc_id, score, _ in hits if doc_id in corpus["row_of_id"]]
+                for hits in dense
+            ]
+        else:
+            corpus = self._ensure_corpus()
+            index = corpus["vector_index"]
+            if index is None:
+                return [[] for _ in query_texts]
+            allowed = self._filter_mask(corpus, intents, style)
+            dense = index.search(query_embeddings, n_results, allowed)
+            if not hybrid:
+                return [[(corpus["ids"][row], corpus["metadatas"][row]) for row in rows] for rows, _ in dense]
+            dense_rows = [list(zip(rows.tolist(), scores.tolist())) for rows, scores in dense]
+
+        lexical = self._lexical_index(corpus)
+        allowed = self._filter_mask(corpus, intents, style)
+        merged = []
+        for text, embedding, dense_hits in zip(query_texts, query_embeddings, dense_rows):
+            dense_scores = dict(dense_hits)
+            # Scored once: the same array gives the lexical candidates and their rerank scores
+            bm25 = lexical.scores(text)
+            lexical_rows, _ = lexical.top_k(bm25, n_results, allowed)
+            candidates = list(dict.fromkeys([row for row, _ in dense_hits] + lexical_rows.tolist()))
+            if not candidates:
+                merged.append([])
+                continue
+
+            lexical_only = [row for row in candidates if row not in dense_scores]
+            if lexical_only:
+                if corpus["vector_index"] is not None:
+                    dense_scores.update(zip(lexical_only, corpus["vector_index"].score(embedding, lexical_only).tolist()))
+                else:
+                    # Chroma only returned its top-n; treat lexical-only hits as the weakest dense match
+                    floor = min(dense_scores.values()) if dense_scores else 0.0
+                    dense_scores.update((row, floor) for row in lexical_only)
+
+            top_bm25 = float(bm25[candidates].max()) or 1.0
+            ranked = sorted(
+                candidates,
+                key=lambda row: self.hybrid_alpha * dense_scores[row] + (1 - self.hybrid_alpha) * bm25[row] / top_bm25,
+                reverse=True
+            )
+            merged.append([(corpus["ids"][row], corpus["metadatas"][row]) for row in ranked[:n_results]])
+        return merged
+
+    def _pack_hits(self, hits, n_results):
+        """
+        Chooses examples from (doc id, metadata) hits by their stored token estimates, then loads
+        json_output from the payload store for the chosen ones only.
+        """
+        # Collections built before the payload store still carry json_output in metadata
+        tokens = [
+            meta["example_tokens"] if "example_tokens" in meta else example_tokens(meta["user_input"], meta["json_output"])
+            for _, meta in hits
+        ]
+        chosen = [hits[i] for i in select_examples(tokens, self.context_token_budget or None, n_results)]
+        payloads = self.payload_store.get([doc_id for doc_id, meta in chosen if "json_output" not in meta])
+        metrics.observe("rag_payload_bytes", sum(len(payload) for payload in payloads.values()))
+        examples = []
+        for doc_id, meta in chosen:
+            json_output = meta["json_output"] if "json_output" in meta else payloads.get(doc_id)
+            if json_output is None:
+                print(f"Warning: payload missing for {doc_id}; run a DB refresh.")
+                continue
+            examples.append(format_example(meta["user_input"], compact_json(json_output)))
+        return examples
+
+    @metrics.timed("rag_query_seconds")
+    def query_db_batch(self, query_texts, n_results=3, intent=None, style=None, hybrid=None):
+        """
+        Retrieves the most relevant examples for many queries at once.
+        Uncached queries are embedded in one forward pass and searched in one batched query.
+
+        Args:
+            intent (str or list): Only return examples with this intent (e.g. "generate_json").
+            style (str): Only return examples whose style_tags contain this text (case-insensitive).
+            hybrid (bool): Merge BM25 (user_input + style_tags) with vector scores. None = retrieval_mode.
+
+        Returns:
+            list: One list of context examples per query text (same order).
+        """
         try:
-            count = self.collection.count()
+            # Read before searching: results computed while a sync bumps the version are stored
+            # under the old version and never served afterwards
+            version = self.data_version
+            hybrid = self.retrieval_mode == "hybrid" if hybrid is None else hybrid
+            intents, style = self._normalize_filters(intent, style)
+            if self.vector_backend == "chroma":
+                count = self.collection.count()
+            else:
+                # No SQLite round-trip on the in-process path
+                count = len(self._ensure_corpus()["ids"])
             if count == 0:
-                return []
+                return [[] for _ in query_texts]
                 
             n_results = min(n_results, count)
+
+            results_by_text = {}
+            for text in set(query_texts):
+                cached = self._query_result_cache.get((version, text, n_results, intents, style, hybrid))
+                if cached is not None:
+                    results_by_text[text] = cached
+            pending = [text for text in dict.fromkeys(query_texts) if text not in results_by_text]
+            metrics.inc("rag_result_cache_lookups_total", len(results_by_text), result="hit")
+            metrics.inc("rag_result_cache_lookups_total", len(pending), result="miss")
+
+            if pending:
+                n_candidates = n_results
+                if self.context_token_budget:
+                    n_candidates = min(count, n_results * self.candidate_multiplier)
+                query_embeddings = self.embed_queries(pending)
+                with metrics.timer("rag_search_seconds", backend=self.vector_backend, hybrid=hybrid):
+                    results = self._search(pending, query_embeddings, n_candidates, intents, style, hybrid)
+                
+                # Format results for LLM context (compacted, within the token budget)
+                for text, hits in zip(pending, results):
+                    with metrics.timer("rag_pack_seconds"):
+                        context_examples = self._pack_hits(hits, n_results)
+                    metrics.observe("rag_context_tokens_estimate", sum(estimate_tokens(ex) for ex in context_examples))
+                    self._query_result_cache.set((version, text, n_results, intents, style, hybrid), context_examples)
+                    results_by_text[text] = context_examples
             
-            results = self.collection.query(
-                query_texts=[query_text],
-                n_results=n_results
-            )
-            
-            # Format results for LLM context
-            context_examples = []
-            if results['metadatas'] and len(results['metadatas']) > 0:
-                for meta in results['metadatas'][0]:
-                    example = f"User Input: {meta['user_input']}\nJSON Output: {meta['json_output']}"
-                    context_examples.append(example)
-            
-            return context_examples
+            return [list(results_by_text.get(text, [])) for text in query_texts]
             
         except Exception as e:
             print(f"Error querying database: {e}")
-            return []
+            return [[] for _ in query_texts]
+
+    def query_db(self, query_text, n_results=3, intent=None, style=None, hybrid=None):
+        """Retrieves most relevant examples for the query (see query_db_batch for the filters)."""
+        return self.query_db_batch([query_text], n_results, intent, style, hybrid)[0]
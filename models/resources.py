@@ -0,0 +1,108 @@
+import threading
+from models.rag_manager import RAGManager
+from models.grok_engine import GrokEngine
+from models.gemini_engine import GeminiEngine
+from models.hedging import HedgedEngine
+from models.intent_classifier import IntentClassifier
+from models.pipeline import ChatPipeline
+from utils.cache import SemanticCache
+
+# UI model name -> engine class
+ENGINE_CLASSES = {
+    "xAI Grok-2": GrokEngine,
+    "Google Gemini 2.0 Flash": GeminiEngine
+}
+
+# Process-wide resources, shared by every Streamlit session and headless caller.
+_registry_lock = threading.Lock()
+_key_locks = {}
+_rag_managers = {}
+_engines = {}
+_hedged_engines = {}
+_pipelines = {}
+
+
+def _lock_for(key):
+    with _registry_lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def is_rag_manager_loaded(**kwargs):
+    return tuple(sorted(kwargs.items())) in _rag_managers
+
+
+def get_rag_manager(**kwargs):
+    """
+    Returns the shared RAGManager for the given constructor arguments, creating it on first use.
+    The embedding model and Chroma client are therefore loaded once per process, not per session.
+    If construction fails nothing is cached, so the next call retries.
+    """
+    key = tuple(sorted(kwargs.items()))
+    manager = _rag_managers.get(key)
+    if manager is None:
+        with _lock_for(("rag",) + key):
+            manager = _rag_managers.get(key)
+            if manager is None:
+                manager = RAGManager(**kwargs)
+                _rag_managers[key] = manager
+    return manager
+
+
+def get_engine(model_name, api_key, use_cache=True):
+    """
+    Returns a pooled engine for (model, API key, cache setting).
+    Engines keep their HTTP client, so repeated messages reuse warm connections.
+    """
+    if model_name not in ENGINE_CLASSES:
+        raise ValueError(f"Bilinmeyen model: {model_name}")
+
+    key = (model_name, api_key, use_cache)
+    engine = _engines.get(key)
+    if engine is None:
+        with _lock_for(("engine",) + key):
+            engine = _engines.get(key)
+            if engine is None:
+                engine = ENGINE_CLASSES[model_name](api_key, use_cache=use_cache)
+                _engines[key] = engine
+    return engine
+
+
+def get_hedged_engine(primary_name, primary_key, secondary_name, secondary_key, use_cache=True, **hedge_kwargs):
+    """
+    Returns a pooled HedgedEngine racing two pooled engines. Pooling keeps the rolling
+    latency window (and so the p95-based hedge delay) alive across requests and sessions.
+    """
+    key = (primary_name, primary_key, secondary_name, secondary_key, use_cache) + tuple(sorted(hedge_kwargs.items()))
+    engine = _hedged_engines.get(key)
+    if engine is None:
+        with _lock_for(("hedged",) + key):
+            engine = _hedged_engines.get(key)
+            if engine is None:
+                engine = HedgedEngine(
+                    get_engine(primary_name, primary_key, use_cache=use_cache),
+                    get_engine(secondary_name, secondary_key, use_cache=use_cache),
+                    **hedge_kwargs
+                )
+                _hedged_engines[key] = engine
+    return engine
+
+
+def get_pipeline(rag_manager=None, use_intent_classifier=False):
+    """
+    Returns the shared ChatPipeline for the given RAG manager. All pipelines run on the same
+    process-wide event loop (see get_background_loop), since they share the pooled engines.
+    use_intent_classifier answers greetings / out-of-scope messages locally (needs a RAG manager).
+    With a RAG manager the pipeline also gets a semantic answer cache (per-call use_semantic_cache).
+    """
+    use_intent_classifier = bool(use_intent_classifier and rag_manager)
+    key = (id(rag_manager), use_intent_classifier)
+    pipeline = _pipelines.get(key)
+    if pipeline is None:
+        with _lock_for(("pipeline",) + key):
+            pipeline = _pipelines.get(key)
+            if pipeline is None:
+                classifier = IntentClassifier(rag_manager) if use_intent_classifier else None
+                semantic_cache = SemanticCache() if rag_manager else None
+                pipeline = ChatPipeline(rag_manager, intent_classifier=classifier, semantic_cache=semantic_cache)
+                _pipelines[key] = pipeline
+    return pipeline
@@ -0,0 +1,160 @@
+import numpy as np
+
+VECTOR_BACKENDS = ("chroma", "exact", "ivf", "auto")
+
+
+def _normalize_rows(matrix, copy=True):
+    """
+    L2-normalizes the rows as float32. With copy=False a writable float32 array is normalized
+    in place (no second full-size buffer); the caller must own it.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    if copy or not matrix.flags.writeable:
+        return matrix / norms
+    return np.divide(matrix, norms, out=matrix)
+
+
+def _top_k(scores, k):
+    """Indices of the k highest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class ExactIndex:
+    """
+    Brute-force cosine top-k: one (queries x dim) @ (dim x rows) matrix product over
+    L2-normalized float32 vectors. Exact, and for corpora up to a few 100k rows still
+    faster than a round-trip through Chroma's SQLite-backed query.
+
+    With copy=False the given float32 array is normalized in place and kept as the index.
+    """
+
+    def __init__(self, vectors, copy=True):
+        self.vectors = _normalize_rows(vectors, copy)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def search(self, query_vectors, k, allowed=None):
+        """
+        Returns one (row indices, cosine scores) pair per query, best first.
+        allowed: optional boolean mask over rows (metadata filter); other rows are never returned.
+        """
+        queries = _normalize_rows(query_vectors)
+        scores = queries @ self.vectors.T
+        if allowed is not None:
+            scores[:, ~allowed] = -np.inf
+            k = min(k, int(allowed.sum()))
+        results = []
+        for row_scores in scores:
+            top = _top_k(row_scores, k)
+            results.append((top, row_scores[top]))
+        return results
+
+    def score(self, query_vector, rows):
+        """Cosine scores of the given rows for one query."""
+        return self.vectors[rows] @ _normalize_rows([query_vector])[0]
+
+
+class IVFIndex:
+    """
+    Approximate inverted-file index (IVF-Flat) in pure NumPy.
+
+    Vectors are clustered with spherical k-means into `n_lists` cells and stored grouped by
+    cell, so every cell is one contiguous slice. A query scores the centroids, then scores
+    exactly only the rows of its `n_probe` nearest cells. More probes = better recall, slower.
+
+    With copy=False the given float32 array is normalized in place before it is regrouped.
+    """
+
+    def __init__(self, vectors, n_lists=None, n_probe=8, train_iterations=10, train_sample=50000, seed=42,
+                 copy=True):
+        vectors = _normalize_rows(vectors, copy)
+        n = len(vectors)
+        self.n_lists = max(1, min(n, n_lists or int(np.sqrt(n))))
+        self.n_probe = max(1, min(n_probe, self.n_lists))
+
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(n, size=min(n, train_sample), replace=False)] if n else vectors
+        self.centroids = self._train(sample, rng, train_iterations)
+
+        assignments = self._assign(vectors)
+        order = np.argsort(assignments, kind="stable")
+        # Rows stored cell by cell; row_ids maps a stored row back to the caller's row index
+        self.vectors = vectors[order]
+        self.row_ids = order
+        counts = np.bincount(assignments, minlength=self.n_lists)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        # Caller row index -> stored row
+        self.stored_row = np.empty(n, dtype=np.int64)
+        self.stored_row[order] = np.arange(n)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def _train(self, sample, rng, iterations):
+        if not len(sample):
+            return np.zeros((self.n_lists, 0), dtype=np.float32)
+        centroids = sample[rng.choice(len(sample), size=self.n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for cell in range(self.n_lists):
+                members = sample[labels == cell]
+                if len(members):
+                    centroids[cell] = members.mean(axis=0)
+                else:
+                    # Re-seed empty cells so every list stays in use
+                    centroids[cell] = sample[rng.integers(len(sample))]
+            centroids = _normalize_rows(centroids)
+        return centroids
+
+    def _assign(self, vectors, batch_size=10000):
+        # Batched so the (rows x n_lists) score matrix stays small
+        labels = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), batch_size):
+            labels[start:start + batch_size] = np.argmax(vectors[start:start + batch_size] @ self.centroids.T, axis=1)
+        return labels
+
+    def search(self, query_vectors, k, allowed=None):
+        """
+        Returns one (row indices, cosine scores) pair per query, best first.
+        allowed: optional boolean mask over rows (metadata filter). When the probed cells hold
+        fewer than k allowed rows, the allowed rows are searched exactly instead.
+        """
+        queries = _normalize_rows(query_vectors)
+        allowed_stored = allowed[self.row_ids] if allowed is not None else None
+        results = []
+        for query, centroid_scores in zip(queries, queries @ self.centroids.T):
+            cells = _top_k(centroid_scores, self.n_probe)
+            candidates = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in cells])
+            if allowed_stored is not None:
+                candidates = candidates[allowed_stored[candidates]]
+                if len(candidates) < k:
+                    candidates = np.flatnonzero(allowed_stored)
+            scores = self.vectors[candidates] @ query
+            top = _top_k(scores, k)
+            results.append((self.row_ids[candidates[top]], scores[top]))
+        return results
+
+    def score(self, query_vector, rows):
+        """Cosine scores of the given rows for one query."""
+        return self.vectors[self.stored_row[rows]] @ _normalize_rows([query_vector])[0]
+
+
+def build_index(vectors, backend="auto", exact_max_rows=50000, copy=True, **ivf_kwargs):
+    """
+    Builds the index for `backend` ("exact", "ivf", or "auto": exact up to exact_max_rows rows).
+    Pass copy=False for a float32 array the caller owns and no longer needs; it is normalized in place.
+    """
+    if backend == "auto":
+        backend = "exact" if len(vectors) <= exact_max_rows else "ivf"
+    if backend == "exact":
+        return ExactIndex(vectors, copy=copy)
+    if backend == "ivf":
+        return IVFIndex(vectors, copy=copy, **ivf_kwargs)
+    raise ValueError(f"Unknown vector backend: {backend}")
@@ -0,0 +1,144 @@
+import json
+import os
+import threading
+from contextlib import ExitStack, contextmanager
+from utils.file_lock import file_lock
+
+
+class VersionedFileStore:
+    """
+    Base of the on-disk side stores (EmbeddingStore, PayloadStore): one append-only data file
+    plus an index that names it.
+
+    Layout under `path`:
+        <file_prefix>[.N].bin - data file of generation N (compaction writes generation N+1)
+        index.json            - the subclass fields + {"file": str, "generation": int}
+        .lock                 - inter-process lock for append / compact
+
+    Writing index.json is the commit point of every change: appends only add bytes after the
+    indexed ones (overwriting leftovers of a write that crashed before its index update) and
+    compaction writes a new data file, so the index never points at the wrong bytes. Other
+    processes pick up changes by reloading the index when its mtime/size changes.
+
+    Subclasses implement _load_index / _index_fields and call _commit after an append,
+    _switch_data_file after writing a compacted file.
+    """
+
+    file_prefix = "data"
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = os.path.join(path, "index.json")
+        self.lock_path = os.path.join(path, ".lock")
+        self._lock = threading.Lock()
+        self._index_stamp = None
+        self.data_file = f"{self.file_prefix}.bin"
+        self.generation = 0
+        # Open batch() blocks; while > 0 the inter-process lock is held and index writes are deferred
+        self._batch_depth = 0
+        self._batch_stack = None
+        self._index_dirty = False
+        self._load()
+
+    @property
+    def data_path(self):
+        return os.path.join(self.path, self.data_file)
+
+    def _load_index(self, index):
+        """Sets the subclass state from a parsed index.json."""
+        raise NotImplementedError
+
+    def _index_fields(self):
+        """Subclass part of index.json."""
+        raise NotImplementedError
+
+    def _stamp(self):
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        stamp = self._stamp()
+        if stamp is None:
+            return
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        self._index_stamp = stamp
+        self.data_file = index.get("file", f"{self.file_prefix}.bin")
+        self.generation = index.get("generation", 0)
+        self._load_index(index)
+
+    def _refresh(self):
+        """Reloads the index if another process appended to or compacted the store."""
+        if self._stamp() != self._index_stamp:
+            self._load()
+
+    def _write_index(self):
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(dict(self._index_fields(), file=self.data_file, generation=self.generation), f)
+        os.replace(tmp_path, self.index_path)
+        self._index_stamp = self._stamp()
+        self._index_dirty = False
+
+    def _commit(self):
+        """Commits appended data: right away, or once at the end of the running batch()."""
+        if self._batch_depth:
+            self._index_dirty = True
+        else:
+            self._write_index()
+
+    @contextmanager
+    def _write_lock(self):
+        """Thread lock plus the inter-process lock (already held while a batch() is open)."""
+        with self._lock:
+            if self._batch_depth:
+                yield
+            else:
+                with file_lock(self.lock_path):
+                    yield
+
+    @contextmanager
+    def batch(self):
+        """
+        Groups many appends: the inter-process lock is held for the whole block and index.json is
+        written once when it ends (also on error; every append's bytes are on disk before it is
+        staged), instead of rewriting the full index after every append.
+        """
+        with self._lock:
+            if not self._batch_depth:
+                stack = ExitStack()
+                stack.enter_context(file_lock(self.lock_path))
+                self._batch_stack = stack
+                self._refresh()
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    try:
+                        if self._index_dirty:
+                            self._write_index()
+                    finally:
+                        self._batch_stack.close()
+                        self._batch_stack = None
+
+    def _next_data_file(self):
+        return f"{self.file_prefix}.{self.generation + 1}.bin"
+
+    def _switch_data_file(self, new_file):
+        """Commits a compaction into `new_file` (already written) and removes the old data file."""
+        old_path = self.data_path
+        self.generation += 1
+        self.data_file = new_file
+        # Written at once even inside a batch: the old file is about to disappear
+        self._write_index()
+        try:
+            os.remove(old_path)
+        except OSError:
+            # Still open or mapped in another process on Windows; harmless leftover
+            pass
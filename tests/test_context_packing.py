@@ -0,0 +1,42 @@
+import json
+
+from utils.context_packing import compact_json, estimate_tokens, example_tokens, format_example, select_examples
+
+
+def test_compact_json_drops_low_value_fields_at_top_level_only():
+    payload = {
+        "version": "1.2",
+        "id": "top",
+        "prompt": "kırmızı bir spor araba",
+        "blueprint": [{"id": "car", "weight": 1.2}, {"id": "road", "depends_on": "car"}]
+    }
+    compacted = compact_json(json.dumps(payload, indent=2))
+    assert json.loads(compacted) == {
+        "prompt": "kırmızı bir spor araba",
+        "blueprint": [{"id": "car", "weight": 1.2}, {"id": "road", "depends_on": "car"}]
+    }
+    # Minified and without \u escapes
+    assert " " not in compacted.replace("kırmızı bir spor araba", "")
+    assert "kırmızı" in compacted
+
+
+def test_compact_json_passes_through_non_json():
+    assert compact_json("düz metin") == "düz metin"
+    assert compact_json(None) is None
+    assert compact_json("[1, 2]") == "[1,2]"
+
+
+def test_example_tokens_match_formatted_example():
+    json_output = json.dumps({"prompt": "a cat", "notes": "x" * 400})
+    assert example_tokens("cat", json_output) == estimate_tokens(format_example("cat", '{"prompt":"a cat"}'))
+
+
+def test_select_examples_skips_oversized_candidates():
+    assert select_examples([50, 400, 60, 70], token_budget=200, max_examples=3) == [0, 2, 3]
+    assert select_examples([50, 400, 60, 70], token_budget=120, max_examples=3) == [0, 2]
+    assert select_examples([500, 500], token_budget=100) == []
+
+
+def test_select_examples_without_budget():
+    assert select_examples([10, 20, 30, 40], token_budget=None, max_examples=3) == [0, 1, 2]
+    assert select_examples([], token_budget=100) == []
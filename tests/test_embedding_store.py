@@ -0,0 +1,68 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("chromadb")
+
+from models.embedding_store import EmbeddingStore
+
+
+def vectors(*rows):
+    return np.asarray(rows, dtype=np.float32)
+
+
+def test_append_and_get(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    store.append(["a", "b", "a"], vectors([1, 0], [0, 1], [9, 9]))
+    assert len(store) == 2
+    got = store.get(["a", "b", "missing"])
+    assert set(got) == {"a", "b"}
+    np.testing.assert_array_equal(got["a"], [1, 0])
+    np.testing.assert_array_equal(got["b"], [0, 1])
+
+
+def test_refresh_across_instances(tmp_path):
+    writer = EmbeddingStore(str(tmp_path))
+    reader = EmbeddingStore(str(tmp_path))
+    assert reader.get(["a"]) == {}
+
+    writer.append(["a"], vectors([1, 2]))
+    np.testing.assert_array_equal(reader.get(["a"])["a"], [1, 2])
+
+    # Rows appended by the other instance are not overwritten
+    reader.append(["b"], vectors([3, 4]))
+    writer.append(["c"], vectors([5, 6]))
+    for store in (writer, reader, EmbeddingStore(str(tmp_path))):
+        got = store.get(["a", "b", "c"])
+        np.testing.assert_array_equal(np.stack([got["a"], got["b"], got["c"]]), [[1, 2], [3, 4], [5, 6]])
+
+
+def test_compaction_seen_by_other_instance(tmp_path):
+    writer = EmbeddingStore(str(tmp_path))
+    reader = EmbeddingStore(str(tmp_path))
+    writer.append(["a", "b", "c"], vectors([1, 1], [2, 2], [3, 3]))
+    assert set(reader.get(["a", "b", "c"])) == {"a", "b", "c"}
+
+    writer.compact({"a", "c"})
+    assert writer.data_file == "vectors.1.bin"
+    assert not (tmp_path / "vectors.bin").exists()
+    got = reader.get(["a", "b", "c"])
+    assert set(got) == {"a", "c"}
+    np.testing.assert_array_equal(got["c"], [3, 3])
+
+
+def test_batch_commits_once(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    other = EmbeddingStore(str(tmp_path))
+    with store.batch():
+        store.append(["a"], vectors([1, 0]))
+        store.append(["b"], vectors([0, 1]))
+        assert set(store.get(["a", "b"])) == {"a", "b"}
+        assert other.get(["a", "b"]) == {}
+    assert set(other.get(["a", "b"])) == {"a", "b"}
+
+
+def test_float16_store(tmp_path):
+    EmbeddingStore(str(tmp_path), dtype="float16").append(["a"], vectors([0.5, 0.25]))
+    store = EmbeddingStore(str(tmp_path))
+    assert store.dtype == np.float16
+    np.testing.assert_array_equal(store.get(["a"])["a"], [0.5, 0.25])
@@ -0,0 +1,102 @@
+from types import SimpleNamespace
+
+import pytest
+
+from utils.eval_store import EvalRunStore, run_config, run_config_key
+
+TEST_DATA = [
+    {"text": "Kırmızı bir spor araba çiz", "expected_intent": "generate_json"},
+    {"text": "CFG Scale nedir?", "expected_intent": "explain_term"}
+]
+
+
+def engines(grok_model="grok-2-latest", temperature=0.7, gemini_model="gemini-2.0-flash"):
+    return {
+        "xAI Grok-2": SimpleNamespace(model=grok_model, temperature=temperature),
+        # Gemini engine has no temperature attribute
+        "Google Gemini 2.0 Flash": SimpleNamespace(model=gemini_model)
+    }
+
+
+def key(**kwargs):
+    return run_config_key(run_config(engines(**kwargs)), TEST_DATA)
+
+
+def test_config_records_model_ids_and_temperature():
+    config = run_config(engines(), {"count": 10}, 3)
+    assert config["models"] == [
+        {"name": "xAI Grok-2", "model": "grok-2-latest", "temperature": 0.7},
+        {"name": "Google Gemini 2.0 Flash", "model": "gemini-2.0-flash", "temperature": None}
+    ]
+    assert config["rag"] == {"count": 10}
+    assert config["n_results"] == 3
+
+
+def test_key_changes_with_model_and_temperature():
+    assert key() == key()
+    assert key(grok_model="grok-3") != key()
+    assert key(gemini_model="gemini-2.5-flash") != key()
+    assert key(temperature=0.2) != key()
+
+
+def test_key_changes_with_test_data_and_retrieval():
+    config = run_config(engines())
+    assert run_config_key(config, TEST_DATA) != run_config_key(config, TEST_DATA[:1])
+    assert run_config_key(run_config(engines(), {"count": 10}, 3), TEST_DATA) != run_config_key(config, TEST_DATA)
+    assert run_config_key(run_config(engines(), {"count": 10}, 3), TEST_DATA) != \
+        run_config_key(run_config(engines(), {"count": 10}, 5), TEST_DATA)
+
+
+def test_unfinished_run_is_found_only_by_same_setup(tmp_path):
+    store = EvalRunStore(str(tmp_path / "runs.sqlite3"))
+    config = run_config(engines())
+    run_id = store.create_run(run_config_key(config, TEST_DATA), config, TEST_DATA)
+    store.record(run_id, 0, "xAI Grok-2", '{"prompt": "car"}', elapsed=1.0)
+
+    assert store.find_unfinished(key()) == run_id
+    assert store.find_unfinished(key(temperature=0.2)) is None
+    assert store.find_unfinished(key(grok_model="grok-3")) is None
+    assert store.get_run(run_id)["config"] == config
+
+    store.finish_run(run_id, [])
+    assert store.find_unfinished(key()) is None
+
+
+def test_evaluate_models_resumes_only_same_model(tmp_path, monkeypatch):
+    # Needs the full app dependencies (pandas, sklearn, chromadb, the provider SDKs)
+    evaluation = pytest.importorskip("utils.evaluation")
+
+    calls = []
+
+    class FakeEngine:
+        def __init__(self, model, temperature=None, fail=False):
+            self.model = model
+            self.temperature = temperature
+            self.fail = fail
+
+        def generate_response(self, text, context_examples=None):
+            calls.append((self.model, text))
+            return "Error communicating with fake: down" if self.fail else '{"prompt": "ok"}'
+
+    setup = {"grok": FakeEngine("grok-2-latest", 0.7, fail=True), "gemini": FakeEngine("gemini-2.0-flash")}
+    monkeypatch.setattr(
+        evaluation, "get_engine", lambda name, key, use_cache=True: setup["grok" if "Grok" in name else "gemini"]
+    )
+    monkeypatch.setattr(evaluation, "load_test_data", lambda: TEST_DATA)
+    store = EvalRunStore(str(tmp_path / "runs.sqlite3"))
+
+    # Grok fails, so the first run stays open
+    first_id = evaluation.evaluate_models("x", "g", max_retries=0, store=store)[3]
+    assert store.get_run(first_id)["finished_at"] is None
+
+    # Same setup: resumed, only the failed Grok items are sent again
+    setup["grok"].fail = False
+    calls.clear()
+    assert evaluation.evaluate_models("x", "g", max_retries=0, store=store)[3] == first_id
+    assert sorted(calls) == [("grok-2-latest", item["text"]) for item in sorted(TEST_DATA, key=lambda i: i["text"])]
+
+    # Another temperature: a new run, every item is sent
+    setup["grok"].temperature = 0.2
+    calls.clear()
+    assert evaluation.evaluate_models("x", "g", max_retries=0, store=store)[3] != first_id
+    assert len(calls) == 2 * len(TEST_DATA)
@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+from models.hedging import HedgedEngine, LatencyWindow
+
+
+class FakeEngine:
+    def __init__(self, model, delay, response='{"prompt": "ok"}'):
+        self.model = model
+        self.delay = delay
+        self.response = response
+        self.cancelled = False
+
+    async def agenerate_response(self, user_input, context_examples=None):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return self.response
+
+    def generate_response(self, user_input, context_examples=None):
+        time.sleep(self.delay)
+        return self.response
+
+
+def samples(hedged, engine):
+    return list(hedged.latencies[id(engine)]._samples)
+
+
+def test_latency_window_percentile():
+    window = LatencyWindow(size=3)
+    assert window.percentile(0.95) is None
+    for seconds in (5.0, 1.0, 2.0, 3.0):
+        window.add(seconds)
+    assert len(window) == 3
+    assert window.percentile(0.0) == 1.0
+    assert window.percentile(1.0) == 3.0
+
+
+def test_cancelled_loser_latency_is_recorded():
+    primary = FakeEngine("slow", delay=1.0, response="slow answer")
+    secondary = FakeEngine("fast", delay=0.01, response="fast answer")
+    hedged = HedgedEngine(primary, secondary, hedge_delay=0.05)
+
+    assert asyncio.run(hedged.agenerate_response("hi")) == "fast answer"
+    assert primary.cancelled
+    assert hedged.stats["secondary_wins"] == 1 and hedged.stats["hedged"] == 1
+    # The loser ran at least until the hedge fired: one lower-bound sample, not nothing
+    (loser_seconds,) = samples(hedged, primary)
+    assert 0.05 <= loser_seconds < 1.0
+    assert len(samples(hedged, secondary)) == 1
+
+
+def test_primary_win_without_hedge():
+    primary = FakeEngine("fast", delay=0.01)
+    secondary = FakeEngine("unused", delay=0.01)
+    hedged = HedgedEngine(primary, secondary, hedge_delay=1.0)
+
+    assert asyncio.run(hedged.agenerate_response("hi")) == '{"prompt": "ok"}'
+    assert hedged.stats["primary_wins"] == 1 and hedged.stats["hedged"] == 0
+    assert len(samples(hedged, primary)) == 1
+    assert samples(hedged, secondary) == []
+
+
+def test_error_responses_are_not_recorded():
+    primary = FakeEngine("down", delay=0.01, response="Error communicating with down: 503")
+    secondary = FakeEngine("up", delay=0.01)
+    hedged = HedgedEngine(primary, secondary, hedge_delay=1.0)
+
+    assert asyncio.run(hedged.agenerate_response("hi")) == '{"prompt": "ok"}'
+    assert samples(hedged, primary) == []
+    assert hedged.stats["secondary_wins"] == 1
+
+
+def test_sync_loser_latency_is_recorded_after_it_finishes():
+    primary = FakeEngine("slow", delay=0.3, response="slow answer")
+    secondary = FakeEngine("fast", delay=0.01, response="fast answer")
+    hedged = HedgedEngine(primary, secondary, hedge_delay=0.05)
+
+    assert hedged.generate_response("hi") == "fast answer"
+    # The losing thread cannot be interrupted; it finishes in the background
+    hedged._executor.shutdown(wait=True)
+    (loser_seconds,) = samples(hedged, primary)
+    assert loser_seconds >= 0.3
+
+
+def test_delay_follows_primary_p95():
+    primary = FakeEngine("p", delay=0.0)
+    hedged = HedgedEngine(primary, FakeEngine("s", delay=0.0), min_samples=5, min_delay=0.1, max_delay=2.0,
+                          default_delay=1.5)
+    assert hedged.current_delay() == 1.5
+    for seconds in (0.2, 0.3, 0.4, 0.5, 5.0):
+        hedged.latencies[id(primary)].add(seconds)
+    assert hedged.current_delay() == 2.0
@@ -0,0 +1,53 @@
+import json
+
+from utils.helpers import JSONStreamExtractor, extract_json
+
+PAYLOAD = {
+    "prompt": "a castle {at} night, \"moody\" lighting \\ fog",
+    "negative_prompt": "blurry}",
+    "params": {"steps": 30, "cfg_scale": 7.5}
+}
+RESPONSE = "İşte promptunuz:\n```json\n" + json.dumps(PAYLOAD, ensure_ascii=False) + "\n```\nİyi çalışmalar! {not json}"
+
+
+def feed_chunks(text, size):
+    extractor = JSONStreamExtractor()
+    result = None
+    for start in range(0, len(text), size):
+        result = extractor.feed(text[start:start + size])
+    return extractor, result
+
+
+def test_extract_json_whole_text():
+    assert extract_json(RESPONSE) == PAYLOAD
+
+
+def test_chunked_feed_matches_whole_text_for_every_chunk_size():
+    # Chunk borders fall inside strings, right after backslashes and between braces
+    for size in range(1, 40):
+        extractor, result = feed_chunks(RESPONSE, size)
+        assert result == PAYLOAD, size
+        assert extractor.done
+
+
+def test_escape_at_chunk_end():
+    extractor = JSONStreamExtractor()
+    assert extractor.feed('{"prompt": "say \\') is None
+    assert extractor.feed('"hi\\"", "n": 1}') == {"prompt": 'say "hi"', "n": 1}
+
+
+def test_invalid_candidate_is_skipped():
+    text = "Örnek: {placeholder} ve sonra " + json.dumps(PAYLOAD)
+    for size in (1, 7, len(text)):
+        assert feed_chunks(text, size)[1] == PAYLOAD
+
+
+def test_result_is_kept_after_done():
+    extractor = JSONStreamExtractor()
+    extractor.feed('{"a": 1}')
+    assert extractor.feed('{"b": 2}') == {"a": 1}
+
+
+def test_no_json():
+    assert feed_chunks("CFG Scale, modelin prompta ne kadar sadık kalacağını belirler.", 5)[1] is None
+    assert extract_json(None) is None
@@ -0,0 +1,65 @@
+import json
+
+from models.payload_store import PayloadStore
+
+
+def test_append_and_get(tmp_path):
+    store = PayloadStore(str(tmp_path))
+    store.append(["a", "b", "a"], ['{"x": 1}', '{"ğ": "ş"}', "duplicate"])
+    assert len(store) == 2
+    assert store.get(["b", "a", "missing"]) == {"a": '{"x": 1}', "b": '{"ğ": "ş"}'}
+    assert PayloadStore(str(tmp_path)).get(["a"]) == {"a": '{"x": 1}'}
+
+
+def test_refresh_across_instances(tmp_path):
+    writer = PayloadStore(str(tmp_path))
+    reader = PayloadStore(str(tmp_path))
+    writer.append(["a"], ["1"])
+    assert reader.contains_all(["a"])
+    assert reader.get(["a"]) == {"a": "1"}
+
+    # Appends from the other instance continue after its bytes, never over them
+    reader.append(["b"], ["22"])
+    writer.append(["c"], ["333"])
+    assert writer.get(["a", "b", "c"]) == {"a": "1", "b": "22", "c": "333"}
+    assert reader.get(["a", "b", "c"]) == {"a": "1", "b": "22", "c": "333"}
+
+
+def test_compaction_seen_by_other_instance(tmp_path):
+    writer = PayloadStore(str(tmp_path))
+    reader = PayloadStore(str(tmp_path))
+    writer.append(["a", "b", "c"], ["1", "22", "333"])
+    assert reader.get(["a"]) == {"a": "1"}
+
+    writer.compact({"b", "c"})
+    assert writer.data_file == "payloads.1.bin"
+    assert not (tmp_path / "payloads.bin").exists()
+    assert reader.get(["a", "b", "c"]) == {"b": "22", "c": "333"}
+    assert len(reader) == 2
+
+
+def test_batch_writes_index_once(tmp_path):
+    store = PayloadStore(str(tmp_path))
+    other = PayloadStore(str(tmp_path))
+    index_path = tmp_path / "index.json"
+    with store.batch():
+        store.append(["a"], ["1"])
+        store.append(["b"], ["22"])
+        # Visible in this instance, not committed for others yet
+        assert store.get(["a", "b"]) == {"a": "1", "b": "22"}
+        assert not index_path.exists()
+        assert len(other) == 0
+    assert json.loads(index_path.read_text())["ids"] == ["a", "b"]
+    assert other.get(["a", "b"]) == {"a": "1", "b": "22"}
+
+
+def test_uncommitted_bytes_are_overwritten(tmp_path):
+    store = PayloadStore(str(tmp_path))
+    store.append(["a"], ["1"])
+    # Bytes of an append that crashed before its index update
+    with open(store.data_path, "ab") as f:
+        f.write(b"garbage")
+    fresh = PayloadStore(str(tmp_path))
+    fresh.append(["b"], ["22"])
+    assert PayloadStore(str(tmp_path)).get(["a", "b"]) == {"a": "1", "b": "22"}
+    assert (tmp_path / "payloads.bin").read_bytes() == b"122"
@@ -0,0 +1,75 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from models.vector_index import ExactIndex, IVFIndex, build_index
+
+
+@pytest.fixture
+def corpus():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(600, 16)).astype(np.float32)
+    queries = rng.normal(size=(5, 16)).astype(np.float32)
+    return vectors, queries
+
+
+def test_exact_index_respects_allowed(corpus):
+    vectors, queries = corpus
+    allowed = np.zeros(len(vectors), dtype=bool)
+    allowed[::7] = True
+    index = ExactIndex(vectors)
+    for rows, scores in index.search(queries, 10, allowed):
+        assert len(rows) == 10
+        assert allowed[rows].all()
+        assert list(scores) == sorted(scores, reverse=True)
+
+
+def test_ivf_allowed_mask_falls_back_to_exact(corpus):
+    vectors, queries = corpus
+    # Few allowed rows and one probed cell: the probed cells rarely hold k allowed rows
+    allowed = np.zeros(len(vectors), dtype=bool)
+    allowed[::50] = True
+    ivf = IVFIndex(vectors, n_lists=24, n_probe=1)
+    exact = ExactIndex(vectors)
+    for (rows, scores), (exact_rows, exact_scores) in zip(
+        ivf.search(queries, 5, allowed), exact.search(queries, 5, allowed)
+    ):
+        assert len(rows) == 5
+        assert allowed[rows].all()
+        np.testing.assert_array_equal(rows, exact_rows)
+        np.testing.assert_allclose(scores, exact_scores, rtol=1e-5)
+
+
+def test_ivf_allowed_fewer_rows_than_k(corpus):
+    vectors, queries = corpus
+    allowed = np.zeros(len(vectors), dtype=bool)
+    allowed[[3, 100, 450]] = True
+    for rows, _ in IVFIndex(vectors, n_lists=24, n_probe=2).search(queries, 10, allowed):
+        assert sorted(rows.tolist()) == [3, 100, 450]
+
+
+def test_ivf_all_probes_is_exact(corpus):
+    vectors, queries = corpus
+    ivf = IVFIndex(vectors, n_lists=24, n_probe=24)
+    exact = ExactIndex(vectors)
+    for (rows, _), (exact_rows, _) in zip(ivf.search(queries, 10), exact.search(queries, 10)):
+        np.testing.assert_array_equal(rows, exact_rows)
+
+
+def test_score_matches_search(corpus):
+    vectors, queries = corpus
+    for index in (ExactIndex(vectors), IVFIndex(vectors, n_lists=24, n_probe=4)):
+        rows, scores = index.search(queries[:1], 5)[0]
+        np.testing.assert_allclose(index.score(queries[0], rows), scores, rtol=1e-5)
+
+
+def test_build_index_copy_flag(corpus):
+    vectors, _ = corpus
+    original = vectors.copy()
+    build_index(vectors, "exact")
+    np.testing.assert_array_equal(vectors, original)
+
+    owned = vectors.copy()
+    index = build_index(owned, "exact", copy=False)
+    assert index.vectors is owned
+    np.testing.assert_allclose(np.linalg.norm(owned, axis=1), 1.0, rtol=1e-5)
@@ -0,0 +1,255 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+from utils.metrics import metrics
+
+DEFAULT_CACHE_PATH = "database/llm_cache.sqlite3"
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache for LLM responses.
+
+    Keys are a hash of (model id, fully built prompt/messages, sampling params), so the
+    same user input with the same RAG context hits the cache regardless of which engine
+    instance or process asked. Entries expire after `ttl_seconds`; when the cache holds
+    more than `max_entries`, the least recently used ones are evicted.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT, response TEXT, "
+                "created_at REAL, last_access REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(model, prompt, params=None):
+        """Builds the cache key from the model id, the built prompt (str or messages list) and sampling params."""
+        payload = json.dumps(
+            {"model": model, "prompt": prompt, "params": params or {}},
+            sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Returns the cached response or None if missing/expired."""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                metrics.inc("response_cache_lookups_total", result="miss")
+                return None
+            response, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                metrics.inc("response_cache_lookups_total", result="expired")
+                return None
+            conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            metrics.inc("response_cache_lookups_total", result="hit")
+            return response
+
+    def set(self, key, response, model=None):
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now)
+            )
+            if self.max_entries:
+                # LRU eviction: drop everything beyond the newest `max_entries` accesses
+                conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+
+    def clear(self):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """
+    Returns the process-wide response cache, or None when caching is bypassed
+    via the LLM_CACHE_DISABLED=1 environment variable.
+    """
+    global _default_cache
+    if os.getenv("LLM_CACHE_DISABLED", "").lower() in ("1", "true", "yes"):
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+        return _default_cache
+
+
+class LRUCache:
+    """Small thread-safe in-memory LRU map used for hot-path lookups (query embeddings, retrieval results)."""
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SemanticCache:
+    """
+    In-memory semantic answer cache: reuses a previous answer of the same model when a new
+    request is a near-duplicate of an earlier one ("Kırmızı araba" / "kırmızı bir araba çiz").
+
+    Requests are stored as L2-normalized embedding vectors (one matrix per model) and a lookup
+    is a single matrix-vector product; the best match is returned when its cosine similarity
+    is at least `threshold`. Entries expire after `ttl_seconds`, and each model keeps at most
+    `max_entries` (least recently used evicted first). Hit/miss counters feed stats().
+    """
+
+    def __init__(self, threshold=0.9, ttl_seconds=24 * 3600, max_entries=2000):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # model -> OrderedDict(text -> (vector, response, created_at)), kept in LRU order
+        self._entries = {}
+        # model -> (texts, matrix) snapshot of _entries, rebuilt lazily after inserts/evictions
+        self._matrices = {}
+        self._last_sweep = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _sweep(self, now):
+        """Drops expired entries of every model; runs at most every ttl/10 seconds (capped at 60s)."""
+        if not self.ttl_seconds or now - self._last_sweep < min(self.ttl_seconds / 10, 60):
+            return
+        self._last_sweep = now
+        for model, entries in self._entries.items():
+            expired = [text for text, (_, _, created_at) in entries.items() if now - created_at > self.ttl_seconds]
+            for text in expired:
+                del entries[text]
+            if expired:
+                self._matrices.pop(model, None)
+
+    def _matrix(self, model):
+        snapshot = self._matrices.get(model)
+        if snapshot is None:
+            entries = self._entries.get(model) or {}
+            texts = list(entries)
+            matrix = np.vstack([entries[text][0] for text in texts]) if texts else None
+            snapshot = self._matrices[model] = (texts, matrix)
+        return snapshot
+
+    def get(self, model, vector):
+        """
+        Returns (response, similarity, matched_text) for the closest earlier request of `model`,
+        or None when nothing is similar enough.
+        """
+        now = time.time()
+        with self._lock:
+            self._sweep(now)
+            texts, matrix = self._matrix(model)
+            if matrix is None:
+                self.misses += 1
+                return None
+            similarities = matrix @ self._normalize(vector)
+            best = int(similarities.argmax())
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            text = texts[best]
+            entries = self._entries[model]
+            _, response, created_at = entries[text]
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                # Expired since the last sweep
+                del entries[text]
+                self._matrices.pop(model, None)
+                self.misses += 1
+                return None
+            entries.move_to_end(text)
+            self.hits += 1
+            return response, float(similarities[best]), text
+
+    def set(self, model, text, vector, response):
+        now = time.time()
+        with self._lock:
+            entries = self._entries.setdefault(model, OrderedDict())
+            entries[text] = (self._normalize(vector), response, now)
+            entries.move_to_end(text)
+            self._sweep(now)
+            while self.max_entries and len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            self._matrices.pop(model, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrices.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        """Hit-rate metrics: {"hits", "misses", "hit_rate", "entries"}."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": sum(len(entries) for entries in self._entries.values())
+            }
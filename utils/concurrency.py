@@ -0,0 +1,75 @@
+import asyncio
+import random
+import threading
+import time
+
+# Engines swallow API exceptions and return this prefix instead (see grok_engine / gemini_engine)
+ERROR_RESPONSE_PREFIX = "Error communicating with"
+
+
+def is_error_response(response):
+    """Returns True if the engine returned its error string instead of a real answer."""
+    return isinstance(response, str) and response.startswith(ERROR_RESPONSE_PREFIX)
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter that spaces calls at least 1/requests_per_second apart.
+    A limiter with requests_per_second=None never blocks.
+    """
+
+    def __init__(self, requests_per_second=None):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def call_with_retry(func, *args, max_retries=2, base_delay=1.0, max_delay=20.0, rate_limiter=None, **kwargs):
+    """
+    Calls func(*args, **kwargs), retrying with exponential backoff + jitter.
+
+    A call is retried when it raises, or when it returns an engine error string.
+    The last exception is re-raised; the last error string is returned as-is.
+    """
+    attempt = 0
+    while True:
+        if rate_limiter:
+            rate_limiter.acquire()
+        try:
+            result = func(*args, **kwargs)
+            if not is_error_response(result) or attempt >= max_retries:
+                return result
+        except Exception:
+            if attempt >= max_retries:
+                raise
+
+        delay = min(max_delay, base_delay * (2 ** attempt))
+        time.sleep(delay * random.uniform(0.5, 1.0))
+        attempt += 1
+
+
+async def async_call_with_retry(func, *args, max_retries=2, base_delay=1.0, max_delay=20.0, **kwargs):
+    """Async counterpart of call_with_retry for coroutine functions (same retry rules)."""
+    attempt = 0
+    while True:
+        try:
+            result = await func(*args, **kwargs)
+            if not is_error_response(result) or attempt >= max_retries:
+                return result
+        except Exception:
+            if attempt >= max_retries:
+                raise
+
+        delay = min(max_delay, base_delay * (2 ** attempt))
+        await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+        attempt += 1
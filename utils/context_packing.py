@@ -0,0 +1,64 @@
+import json
+import math
+
+# Top-level keys that carry no visual information for the model; dropped from RAG examples.
+# Nested keys are kept: e.g. "id" inside blueprint / variant entries links parts of the prompt.
+LOW_VALUE_FIELDS = {"version", "project_name", "output_format", "id", "timestamp", "notes", "comment", "comments"}
+
+
+def estimate_tokens(text):
+    """
+    Cheap token estimate (~4 characters per token for mixed Turkish/English JSON).
+    Good enough for budgeting; no tokenizer dependency.
+    """
+    return max(1, math.ceil(len(text) / 4))
+
+
+def compact_json(json_text, drop_fields=LOW_VALUE_FIELDS):
+    """
+    Minifies a JSON string (no whitespace, no \\u escapes) and drops low-value top-level fields.
+    Non-JSON text is returned unchanged.
+    """
+    try:
+        data = json.loads(json_text)
+    except (json.JSONDecodeError, TypeError):
+        return json_text
+    if isinstance(data, dict):
+        data = {k: v for k, v in data.items() if k not in drop_fields}
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def format_example(user_input, json_output):
+    return f"User Input: {user_input}\nJSON Output: {json_output}"
+
+
+def example_tokens(user_input, json_output):
+    """Estimated prompt tokens of one example as it is formatted into the prompt."""
+    return estimate_tokens(format_example(user_input, compact_json(json_output)))
+
+
+def select_examples(token_counts, token_budget=None, max_examples=3):
+    """
+    Picks RAG examples under a token budget by their estimated token counts and returns the
+    chosen indices, so callers load example payloads only for the examples actually used.
+
+    Args:
+        token_counts (list): Estimated tokens per candidate (see example_tokens), most relevant first.
+        token_budget (int): Max estimated tokens for all examples together (None = unlimited).
+        max_examples (int): Max number of examples to return.
+
+    Candidates are taken in relevance order; one that does not fit the remaining
+    budget is skipped, so a smaller but slightly less similar example can take its
+    place instead of one oversized blueprint crowding out everything else.
+    """
+    chosen = []
+    remaining = token_budget
+    for i, tokens in enumerate(token_counts):
+        if len(chosen) >= max_examples:
+            break
+        if remaining is not None:
+            if tokens > remaining:
+                continue
+            remaining -= tokens
+        chosen.append(i)
+    return chosen
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+from openpyxl import load_workbook
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Columnar cache is optional; without pyarrow the sheet is streamed through openpyxl
+    pa = pq = None
+
+# Columns the RAG pipeline reads from the prompt sheet
+SOURCE_COLUMNS = ["user_input", "intent", "style_tags", "json_output"]
+
+# Default location of the Parquet copies of Excel sources, one per source file (see ensure_columnar_cache).
+# RAGManager keeps its copies next to its own db_path instead.
+COLUMNAR_CACHE_DIR = "database/columnar"
+
+
+def _cell_to_str(value):
+    return "" if value is None else str(value)
+
+
+def count_excel_rows(excel_path):
+    """Returns the number of data rows (excluding the header) or None if the sheet has no dimension info."""
+    wb = load_workbook(excel_path, read_only=True)
+    try:
+        max_row = wb.active.max_row
+        return max_row - 1 if max_row else None
+    finally:
+        wb.close()
+
+
+def iter_excel_chunks(excel_path, columns=SOURCE_COLUMNS, chunk_size=1000):
+    """
+    Streams an Excel sheet as column-oriented chunks without loading it into memory.
+
+    Yields dicts of {column: [str values]} with at most `chunk_size` rows each. Columns
+    missing from the sheet are filled with empty strings; fully empty rows are skipped.
+    """
+    wb = load_workbook(excel_path, read_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        positions = {name: idx for idx, name in enumerate(header) if name is not None}
+        column_positions = [(col, positions.get(col)) for col in columns]
+
+        chunk = {col: [] for col in columns}
+        size = 0
+        for row in rows:
+            if not any(cell is not None for cell in row):
+                continue
+            for col, pos in column_positions:
+                chunk[col].append(_cell_to_str(row[pos]) if pos is not None and pos < len(row) else "")
+            size += 1
+            if size >= chunk_size:
+                yield chunk
+                chunk = {col: [] for col in columns}
+                size = 0
+        if size:
+            yield chunk
+    finally:
+        wb.close()
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _columnar_paths(excel_path, cache_dir):
+    name = os.path.splitext(os.path.basename(excel_path))[0]
+    # Different sources with the same file name must not share a cache file
+    tag = hashlib.sha1(os.path.abspath(excel_path).encode("utf-8")).hexdigest()[:8]
+    base = os.path.join(cache_dir, f"{name}-{tag}")
+    return base + ".parquet", base + ".meta.json"
+
+
+def _prune_columnar_cache(parquet_path, meta_path):
+    """Removes the cached copy of one source together with conversion leftovers (crashed *.tmp files)."""
+    directory = os.path.dirname(parquet_path)
+    prefix = os.path.basename(parquet_path) + "."
+    stale = [parquet_path, meta_path]
+    if os.path.isdir(directory):
+        stale += [
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.startswith(prefix) and name.endswith(".tmp")
+        ]
+    for path in stale:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def ensure_columnar_cache(excel_path, cache_dir=COLUMNAR_CACHE_DIR, chunk_size=5000):
+    """
+    Returns the path of a Parquet copy of the Excel sheet (SOURCE_COLUMNS only, all values as strings),
+    converting it first if the copy is missing or stale. Returns None when pyarrow is not installed
+    or the conversion fails, so callers fall back to reading the sheet directly.
+
+    Staleness is checked by file size + mtime; if those changed but the content hash did not
+    (file copied or touched), only the stored fingerprint is updated.
+    """
+    if pq is None or not os.path.exists(excel_path):
+        return None
+
+    parquet_path, meta_path = _columnar_paths(excel_path, cache_dir)
+    stat = os.stat(excel_path)
+    fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    meta = None
+    if os.path.exists(parquet_path) and os.path.exists(meta_path):
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = None
+    if meta and meta.get("columns") == SOURCE_COLUMNS:
+        if all(meta.get(key) == value for key, value in fingerprint.items()):
+            return parquet_path
+        sha256 = _file_sha256(excel_path)
+        if meta.get("sha256") == sha256:
+            meta.update(fingerprint)
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            return parquet_path
+    else:
+        sha256 = _file_sha256(excel_path)
+
+    # The old copy of this source is outdated: drop it (and any half-written conversion) before rebuilding
+    _prune_columnar_cache(parquet_path, meta_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{parquet_path}.{os.getpid()}.tmp"
+    schema = pa.schema([(col, pa.string()) for col in SOURCE_COLUMNS])
+    rows = 0
+    try:
+        # Streams the sheet once; each chunk becomes a Parquet row group
+        with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+            for chunk in iter_excel_chunks(excel_path, SOURCE_COLUMNS, chunk_size):
+                writer.write_table(pa.table(chunk, schema=schema))
+                rows += len(chunk[SOURCE_COLUMNS[0]])
+        os.replace(tmp_path, parquet_path)
+    except Exception as e:
+        print(f"Columnar cache conversion failed, reading {excel_path} directly: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(dict(fingerprint, sha256=sha256, rows=rows, columns=SOURCE_COLUMNS,
+                       source=os.path.abspath(excel_path)), f)
+    print(f"Columnar cache written: {parquet_path} ({rows} rows).")
+    return parquet_path
+
+
+def count_source_rows(excel_path, use_columnar=True, cache_dir=COLUMNAR_CACHE_DIR):
+    """Row count of the source sheet, from the Parquet footer when the columnar cache is available."""
+    parquet_path = ensure_columnar_cache(excel_path, cache_dir) if use_columnar else None
+    if parquet_path:
+        return pq.ParquetFile(parquet_path).metadata.num_rows
+    return count_excel_rows(excel_path)
+
+
+def iter_source_chunks(excel_path, columns=SOURCE_COLUMNS, chunk_size=1000, use_columnar=True,
+                       cache_dir=COLUMNAR_CACHE_DIR):
+    """
+    Same chunks as iter_excel_chunks, served from the Parquet cache in `cache_dir` when possible.
+    Only the requested columns are read from the cache.
+    """
+    if use_columnar and set(columns) <= set(SOURCE_COLUMNS):
+        parquet_path = ensure_columnar_cache(excel_path, cache_dir)
+    else:
+        parquet_path = None
+    if not parquet_path:
+        yield from iter_excel_chunks(excel_path, columns, chunk_size)
+        return
+    for batch in pq.ParquetFile(parquet_path).iter_batches(batch_size=chunk_size, columns=list(columns)):
+        yield {col: batch.column(col).to_pylist() for col in columns}
+
+
+def read_source_columns(excel_path, columns=SOURCE_COLUMNS, use_columnar=True, cache_dir=COLUMNAR_CACHE_DIR):
+    """Loads the given columns of the whole sheet as {column: [str values]}."""
+    data = {col: [] for col in columns}
+    for chunk in iter_source_chunks(excel_path, columns, chunk_size=50000, use_columnar=use_columnar,
+                                    cache_dir=cache_dir):
+        for col in columns:
+            data[col].extend(chunk[col])
+    return data
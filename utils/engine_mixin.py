@@ -0,0 +1,145 @@
+import asyncio
+from utils.cache import ResponseCache
+from utils.metrics import LLMCall
+from utils.recorder import record_response
+
+
+class CachedEngineMixin:
+    """
+    Shared request flow of the LLM engines: response-cache lookup, metrics span (LLMCall),
+    recording, cache write and the engine's error string. The engine methods only supply the
+    provider call; sync and async variants behave the same way.
+
+    Engines set `self.model`, `self.cache` (ResponseCache or None) and `error_prefix`, and may
+    override `_cache_key` / `_request_text` for their request format.
+    """
+
+    error_prefix = "Error communicating with the LLM"
+
+    def _cache_key(self, request):
+        return ResponseCache.make_key(self.model, request)
+
+    @staticmethod
+    def _request_text(request):
+        """Text actually sent to the API, for the prompt size metrics."""
+        return request
+
+    def _error(self, exc):
+        return f"{self.error_prefix}: {str(exc)}"
+
+    def _complete(self, user_input, request, mode, call_provider):
+        """
+        Runs one non-streaming request.
+
+        Args:
+            user_input (str): The user's message (recorded with the response).
+            request: The built prompt or messages (cache key and prompt metrics).
+            mode (str): Metrics label, e.g. "sync".
+            call_provider (callable): Sends the request and returns the response text.
+        """
+        cache_key = None
+        if self.cache:
+            cache_key = self._cache_key(request)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                LLMCall.cache_hit(self.model, mode)
+                return cached
+
+        call = LLMCall(self.model, mode, self._request_text(request))
+        try:
+            text = call_provider()
+        except Exception as e:
+            error = self._error(e)
+            call.finish(error)
+            return error
+        call.finish(text)
+        record_response(self.model, user_input, text)
+        if self.cache and text:
+            self.cache.set(cache_key, text, model=self.model)
+        return text
+
+    def _complete_stream(self, user_input, request, mode, stream_provider):
+        """
+        Streaming variant of _complete: `stream_provider()` returns an iterable of text chunks.
+        A cached response is yielded as a single chunk; on failure the error string is yielded.
+        """
+        cache_key = None
+        if self.cache:
+            cache_key = self._cache_key(request)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                LLMCall.cache_hit(self.model, mode)
+                yield cached
+                return
+
+        call = LLMCall(self.model, mode, self._request_text(request))
+        chunks = []
+        try:
+            for chunk in stream_provider():
+                call.chunk()
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            error = self._error(e)
+            call.finish(error)
+            yield error
+            return
+
+        text = "".join(chunks)
+        call.finish(text)
+        record_response(self.model, user_input, text)
+        if self.cache and text:
+            self.cache.set(cache_key, text, model=self.model)
+
+    async def _acomplete(self, user_input, request, mode, call_provider):
+        """Async _complete: `call_provider()` returns an awaitable; cache I/O runs off the event loop."""
+        cache_key = None
+        if self.cache:
+            cache_key = self._cache_key(request)
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                LLMCall.cache_hit(self.model, mode)
+                return cached
+
+        call = LLMCall(self.model, mode, self._request_text(request))
+        try:
+            text = await call_provider()
+        except Exception as e:
+            error = self._error(e)
+            call.finish(error)
+            return error
+        call.finish(text)
+        record_response(self.model, user_input, text)
+        if self.cache and text:
+            await asyncio.to_thread(self.cache.set, cache_key, text, model=self.model)
+        return text
+
+    async def _acomplete_stream(self, user_input, request, mode, stream_provider):
+        """Async _complete_stream: `stream_provider()` returns an async iterable of text chunks."""
+        cache_key = None
+        if self.cache:
+            cache_key = self._cache_key(request)
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                LLMCall.cache_hit(self.model, mode)
+                yield cached
+                return
+
+        call = LLMCall(self.model, mode, self._request_text(request))
+        chunks = []
+        try:
+            async for chunk in stream_provider():
+                call.chunk()
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            error = self._error(e)
+            call.finish(error)
+            yield error
+            return
+
+        text = "".join(chunks)
+        call.finish(text)
+        record_response(self.model, user_input, text)
+        if self.cache and text:
+            await asyncio.to_thread(self.cache.set, cache_key, text, model=self.model)
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+DEFAULT_EVAL_STORE_PATH = "database/eval_runs.sqlite3"
+
+
+def run_config(engines, rag_fingerprint=None, n_results=None):
+    """
+    Setup of an evaluation run, stored with it and hashed into its config key.
+
+    Args:
+        engines (dict): Display name -> engine. Model ids and temperatures are recorded, not just
+            the names, so a changed model or sampling setting never resumes an old run.
+        rag_fingerprint (dict): RAGManager.retrieval_fingerprint(), None for zero-shot runs.
+        n_results (int): RAG examples per test item, None for zero-shot runs.
+    """
+    return {
+        "models": [
+            {"name": name, "model": engine.model, "temperature": getattr(engine, "temperature", None)}
+            for name, engine in engines.items()
+        ],
+        "rag": rag_fingerprint,
+        "n_results": n_results
+    }
+
+
+def run_config_key(config, test_data):
+    """Key of a run setup (config + test set); an unfinished run is resumed only by the same key."""
+    return hashlib.sha256(
+        json.dumps([config, test_data], sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+class EvalRunStore:
+    """
+    Persists evaluation runs incrementally, one row per finished (test item, model) response.
+
+    A run stores its config and a snapshot of the test set, so an interrupted run can be resumed
+    (only the missing or failed items are sent again) and a finished run can be reloaded later
+    for comparison without calling the APIs.
+    """
+
+    def __init__(self, path=DEFAULT_EVAL_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                "run_id TEXT PRIMARY KEY, config_key TEXT, config TEXT, test_data TEXT, "
+                "created_at REAL, finished_at REAL, metrics TEXT)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "run_id TEXT, item_index INTEGER, model TEXT, response TEXT, "
+                "elapsed REAL, is_error INTEGER, created_at REAL, "
+                "PRIMARY KEY (run_id, item_index, model))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_config ON runs(config_key, finished_at)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create_run(self, config_key, config, test_data, run_id=None):
+        """Starts a new run and returns its id."""
+        run_id = run_id or time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6]
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO runs (run_id, config_key, config, test_data, created_at) VALUES (?, ?, ?, ?, ?)",
+                (run_id, config_key, json.dumps(config, ensure_ascii=False),
+                 json.dumps(test_data, ensure_ascii=False), time.time())
+            )
+        return run_id
+
+    def find_unfinished(self, config_key):
+        """Returns the id of the latest unfinished run with this config, or None."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT run_id FROM runs WHERE config_key = ? AND finished_at IS NULL "
+                "ORDER BY created_at DESC LIMIT 1",
+                (config_key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_run(self, run_id):
+        """Returns {"run_id", "config", "test_data", "created_at", "finished_at", "metrics"} or None."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT config, test_data, created_at, finished_at, metrics FROM runs WHERE run_id = ?", (run_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        config, test_data, created_at, finished_at, metrics = row
+        return {
+            "run_id": run_id,
+            "config": json.loads(config),
+            "test_data": json.loads(test_data),
+            "created_at": created_at,
+            "finished_at": finished_at,
+            "metrics": json.loads(metrics) if metrics else None
+        }
+
+    def list_runs(self, limit=50):
+        """Newest first: one dict per run with its progress (answered items) and status."""
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT r.run_id, r.config, r.created_at, r.finished_at, "
+                "(SELECT COUNT(*) FROM results s WHERE s.run_id = r.run_id AND s.is_error = 0) "
+                "FROM runs r ORDER BY r.created_at DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [
+            {
+                "run_id": run_id,
+                "config": json.loads(config),
+                "created_at": created_at,
+                "finished_at": finished_at,
+                "answered": answered
+            }
+            for run_id, config, created_at, finished_at, answered in rows
+        ]
+
+    def record(self, run_id, item_index, model, response, elapsed=None, is_error=False):
+        """Saves one response as soon as it arrives (a retry of a failed item overwrites it)."""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (run_id, item_index, model, response, elapsed, is_error, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (run_id, item_index, model, response, elapsed, int(is_error), time.time())
+            )
+
+    def load_results(self, run_id, include_errors=True):
+        """Returns {(item_index, model): response} for the run."""
+        query = "SELECT item_index, model, response FROM results WHERE run_id = ?"
+        if not include_errors:
+            query += " AND is_error = 0"
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(query, (run_id,)).fetchall()
+        return {(item_index, model): response for item_index, model, response in rows}
+
+    def finish_run(self, run_id, metrics):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE runs SET finished_at = ?, metrics = ? WHERE run_id = ?",
+                (time.time(), json.dumps(metrics, ensure_ascii=False), run_id)
+            )
+
+    def delete_run(self, run_id):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM results WHERE run_id = ?", (run_id,))
+            conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
@@ -1,13 +1,17 @@
 import time
+import hashlib
 import pandas as pd
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from sklearn.metrics import precision_score, recall_score, f1_score
-from models.grok_engine import GrokEngine
-from models.gemini_engine import GeminiEngine
+from models.resources import get_engine
 from utils.helpers import extract_json
+from utils.concurrency import RateLimiter, call_with_retry, is_error_response
+from utils.eval_store import EvalRunStore, run_config, run_config_key
 
 TEST_DATA_PATH = "data/test_set.json"
+RETRIEVAL_CACHE_DIR = "database/eval_retrieval"
 
 def load_test_data():
     """Loads test data from the JSON file generated by RAGManager."""
@@ -22,9 +26,117 @@ def load_test_data():
     with open(TEST_DATA_PATH, 'r', encoding='utf-8') as f:
         return json.load(f)
 
-def evaluate_models(xai_key, google_key, progress_callback=None):
+def precompute_contexts(rag_manager, test_data, n_results=3, cache_dir=RETRIEVAL_CACHE_DIR):
+    """
+    Retrieves the RAG context of every test item in one batched query_db_batch call.
+    Results are cached on disk per (test set, collection contents, retrieval settings), so all
+    engines, and later runs on the same data, replay them without querying the vector DB again.
+    """
+    texts = [item["text"] for item in test_data]
+    key_payload = json.dumps([rag_manager.retrieval_fingerprint(), n_results, texts], ensure_ascii=False)
+    path = os.path.join(cache_dir, hashlib.sha256(key_payload.encode("utf-8")).hexdigest() + ".json")
+
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                contexts = json.load(f)
+            if len(contexts) == len(texts):
+                print(f"RAG bağlamı önbellekten yüklendi ({len(texts)} test örneği).")
+                return contexts
+        except (OSError, json.JSONDecodeError):
+            pass
+
+    start_time = time.time()
+    contexts = rag_manager.query_db_batch(texts, n_results)
+    print(f"RAG bağlamı {len(texts)} test örneği için {time.time() - start_time:.2f}s içinde hazırlandı.")
+
+    # query_db_batch returns empty lists on errors; do not persist such a result
+    if any(contexts):
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(contexts, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    return contexts
+
+def _run_single_test(engine, text, context_examples, rate_limiter, max_retries):
+    """Sends one test question to one engine. Returns (response, elapsed_seconds)."""
+    start_time = time.time()
+    # Test items are never in the RAG collection (they are split off before the DB sync),
+    # so their retrieved context does not leak the answer. Empty context = zero-shot.
+    response = call_with_retry(
+        engine.generate_response, text, context_examples=context_examples,
+        max_retries=max_retries, rate_limiter=rate_limiter
+    )
+    return response, time.time() - start_time
+
+def _score_models(model_names, test_data, responses_log):
+    """Precision / recall / F1 of the generate_json decision per model, from the logged responses."""
+    y_true = [1 if item["expected_intent"] == "generate_json" else 0 for item in test_data]
+    results = []
+    for model_name in model_names:
+        # Missing or failed answers count as "no JSON"
+        y_pred = [1 if extract_json(responses_log[i].get(model_name) or "") else 0 for i in range(len(test_data))]
+
+        # Calculate Metrics
+        precision = precision_score(y_true, y_pred, zero_division=0)
+        recall = recall_score(y_true, y_pred, zero_division=0)
+        f1 = f1_score(y_true, y_pred, zero_division=0)
+        
+        results.append({
+            "Model": model_name,
+            "Precision": round(precision, 4),
+            "Recall": round(recall, 4),
+            "F1 Score": round(f1, 4)
+        })
+    return pd.DataFrame(results)
+
+def load_run(run_id, store=None):
+    """
+    Rebuilds (results_df, responses_log, test_data) of a stored run without calling any API.
+    Returns None if the run does not exist.
+    """
+    store = store or EvalRunStore()
+    run = store.get_run(run_id)
+    if run is None:
+        return None
+    test_data = run["test_data"]
+    responses_log = {i: {} for i in range(len(test_data))}
+    for (i, model_name), response in store.load_results(run_id).items():
+        if i in responses_log:
+            responses_log[i][model_name] = response
+    # Runs stored before model ids were recorded list plain display names
+    model_names = [m["name"] if isinstance(m, dict) else m for m in run["config"]["models"]]
+    return _score_models(model_names, test_data, responses_log), responses_log, test_data
+
+def evaluate_models(xai_key, google_key, progress_callback=None, max_workers_per_engine=4, requests_per_second=None, max_retries=2, use_cache=True,
+                    rag_manager=None, n_results=3, run_id=None, resume=True, store=None):
     """
     Evaluates both models using the separate test set (20% split).
+
+    Test items are sent concurrently: every engine gets its own thread pool of
+    `max_workers_per_engine` threads and its own rate limiter, so a slow provider
+    does not hold back the other one. `max_workers_per_engine=1` runs sequentially.
+
+    Every response is written to the run store as soon as it arrives. Starting the same
+    evaluation again (same models, test set and retrieval setup) resumes the latest unfinished
+    run: answered items are taken from the store and only the missing or failed ones are sent.
+
+    Args:
+        progress_callback (callable): Called from the calling thread with a 0-1 progress value.
+        max_workers_per_engine (int): Max in-flight requests per engine.
+        requests_per_second (float): Per-engine request rate cap (None = unlimited).
+        max_retries (int): Retries (with exponential backoff) for failed API calls.
+        use_cache (bool): Serve repeated questions from the on-disk response cache.
+        rag_manager (RAGManager): Evaluate with RAG context like the chat path does. Retrieval runs once
+            per test set (see precompute_contexts) and is replayed for every engine. None = zero-shot.
+        n_results (int): Number of RAG examples per test item.
+        run_id (str): Continue (or create) this specific run. A finished run is loaded, not re-run.
+        resume (bool): Without run_id, continue the latest unfinished run with the same setup.
+        store (EvalRunStore): Run store (default: database/eval_runs.sqlite3).
+
+    Returns:
+        tuple: (results_df, responses_log, test_data, run_id)
     """
     
     # Validation: Ensure keys are present
@@ -32,88 +144,101 @@ def evaluate_models(xai_key, google_key, progress_callback=None):
         raise ValueError("API anahtarları eksik! Lütfen hem xAI hem Google API anahtarlarını giriniz.")
 
     engines = {
-        "xAI Grok-2": GrokEngine(xai_key),
-        "Google Gemini 2.0 Flash": GeminiEngine(google_key)
+        "xAI Grok-2": get_engine("xAI Grok-2", xai_key, use_cache=use_cache),
+        "Google Gemini 2.0 Flash": get_engine("Google Gemini 2.0 Flash", google_key, use_cache=use_cache)
     }
+    store = store or EvalRunStore()
 
     # Load dynamic test data
     test_data = load_test_data()
-    results = []
+    if rag_manager is not None:
+        config = run_config(engines, rag_manager.retrieval_fingerprint(), n_results)
+    else:
+        config = run_config(engines)
+    config_key = run_config_key(config, test_data)
+
+    run = store.get_run(run_id) if run_id else None
+    if run is None and run_id is None and resume:
+        existing_id = store.find_unfinished(config_key)
+        run = store.get_run(existing_id) if existing_id else None
+    if run is not None:
+        if run["finished_at"] is not None:
+            print(f"Koşu {run['run_id']} zaten tamamlanmış; kayıtlı sonuçlar yükleniyor.")
+            return (*load_run(run["run_id"], store), run["run_id"])
+        run_id = run["run_id"]
+        # Resume against the run's own test set snapshot, even if test_set.json changed since
+        test_data = run["test_data"]
+    else:
+        run_id = store.create_run(config_key, config, test_data, run_id=run_id)
+
+    if rag_manager is not None:
+        contexts = precompute_contexts(rag_manager, test_data, n_results)
+    else:
+        contexts = [[] for _ in test_data]
     
-    # Stores detailed responses
+    # Stores detailed responses; answers already in the store are not requested again
     responses_log = {i: {} for i in range(len(test_data))}
-    
-    y_true = [1 if item["expected_intent"] == "generate_json" else 0 for item in test_data]
+    for (i, model_name), response in store.load_results(run_id, include_errors=False).items():
+        if i in responses_log:
+            responses_log[i][model_name] = response
 
     total_steps = len(test_data) * len(engines)
-    current_step = 0
+    current_step = sum(len(answers) for answers in responses_log.values())
 
     print("\n🚀 --- PERFORMANS TESTİ BAŞLIYOR (Split Test Data) ---")
-    print(f"Toplam Test Verisi: {len(test_data)}")
+    print(f"Koşu: {run_id} | Toplam Test Verisi: {len(test_data)} ({'RAG bağlamı' if rag_manager is not None else 'Zero-Shot'})")
+    if current_step:
+        print(f"Kaldığı yerden devam ediliyor: {current_step}/{total_steps} yanıt kayıtlı.")
+        if progress_callback:
+            progress_callback(current_step / total_steps)
 
-    for model_name, engine in engines.items():
-        y_pred = []
-        print(f"🔵 [{model_name}] Test Ediliyor...")
-        
-        for i, item in enumerate(test_data):
+    executors = {
+        model_name: ThreadPoolExecutor(max_workers=max(1, max_workers_per_engine), thread_name_prefix=model_name)
+        for model_name in engines
+    }
+    try:
+        futures = {}
+        for model_name, engine in engines.items():
+            print(f"🔵 [{model_name}] Test Ediliyor...")
+            rate_limiter = RateLimiter(requests_per_second)
+            for i, item in enumerate(test_data):
+                if model_name in responses_log[i]:
+                    continue
+                future = executors[model_name].submit(_run_single_test, engine, item["text"], contexts[i], rate_limiter, max_retries)
+                futures[future] = (model_name, i)
+
+        # Progress is reported (and results stored) from this thread (Streamlit widgets are not thread-safe)
+        for future in as_completed(futures):
+            model_name, i = futures[future]
+            text = test_data[i]["text"]
             try:
-                print(f"   Testing: '{item['text']}' -> ", end="", flush=True)
-                
-                start_time = time.time()
-                # Test data should NOT be in the RAG context (Data Leakage prevention)
-                # Ideally, we query RAG for context using the test question
-                # But to test pure model capability vs RAG capability, we can choose.
-                # Here we will simulate a real user query:
-                # 1. Query RAG (which contains only TRAIN data)
-                # 2. Feed to LLM
-                
-                # Note: To avoid circular import, we won't import RAGManager here 
-                # but pass empty context or assume app.py handles it.
-                # For this evaluation, let's test RAW model capability or with empty context
-                # to strictly measure Intent Classification without RAG hints if possible,
-                # OR we accept that RAG is part of the system pipeline.
-                
-                # Decision: Let's test the System Pipeline. 
-                # Since we can't easily access RAGManager instance here without passing it,
-                # we will use empty context for now to test the "Zero-Shot" intent classification capability.
-                # If the goal is testing RAG retrieval + LLM, we'd need the RAG instance.
-                
-                response = engine.generate_response(item["text"], context_examples=[])
-                elapsed = time.time() - start_time
-                
+                response, elapsed = future.result()
                 responses_log[i][model_name] = response
-                
-                json_content = extract_json(response)
-                
-                if json_content:
-                    pred_label = 1 # generate_json
-                    print(f"JSON Üretti ({elapsed:.2f}s)")
+                store.record(run_id, i, model_name, response, elapsed, is_error=is_error_response(response))
+
+                if extract_json(response):
+                    print(f"   [{model_name}] '{text}' -> JSON Üretti ({elapsed:.2f}s)")
                 else:
-                    pred_label = 0 # explain_term / others
-                    print(f"Metin Üretti ({elapsed:.2f}s)")
-                
-                y_pred.append(pred_label)
-                    
+                    print(f"   [{model_name}] '{text}' -> Metin Üretti ({elapsed:.2f}s)")
             except Exception as e:
-                print(f"\n   ❌ Hata: {e}")
+                print(f"   ❌ [{model_name}] '{text}' -> Hata: {e}")
                 responses_log[i][model_name] = f"Error: {str(e)}"
-                y_pred.append(0)
+                store.record(run_id, i, model_name, responses_log[i][model_name], is_error=True)
 
             current_step += 1
             if progress_callback:
                 progress_callback(current_step / total_steps)
-        
-        # Calculate Metrics
-        precision = precision_score(y_true, y_pred, zero_division=0)
-        recall = recall_score(y_true, y_pred, zero_division=0)
-        f1 = f1_score(y_true, y_pred, zero_division=0)
-        
-        results.append({
-            "Model": model_name,
-            "Precision": round(precision, 4),
-            "Recall": round(recall, 4),
-            "F1 Score": round(f1, 4)
-        })
+    finally:
+        for executor in executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    results_df = _score_models(engines, test_data, responses_log)
+    # Runs with failed items stay open, so starting the test again retries just those
+    failed = total_steps - len(store.load_results(run_id, include_errors=False))
+    if failed:
+        print(f"⚠️ {failed} yanıt hatalı; koşu {run_id} açık bırakıldı (tekrar başlatınca yalnızca bunlar denenecek).")
+    else:
+        store.finish_run(run_id, results_df.to_dict(orient="records"))
 
     print("🏁 --- TEST BİTTİ --- \n")
-    return pd.DataFrame(results), responses_log, test_data
+    return results_df, responses_log, test_data, run_id
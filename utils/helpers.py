@@ -1,36 +1,105 @@
 import json
 import re
+from utils.metrics import metrics
+
+# Characters that can change the scanner state: braces outside strings, quotes and escapes inside them
+_SPECIAL_CHARS = re.compile(r'[{}"\\]')
+
+class JSONStreamExtractor:
+    """
+    Single-pass, incremental extractor for the first JSON object in a text stream.
+
+    Tracks brace depth and string/escape state across chunks, so text can be fed
+    as it arrives from the model. Each character is scanned once; the candidate
+    object is parsed only when its closing brace arrives. Text outside objects
+    (prose, markdown fences) is skipped. Candidates that fail to parse are dropped
+    and scanning continues after them.
+    """
+
+    def __init__(self):
+        self.result = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._parts = []
+
+    @property
+    def done(self):
+        return self.result is not None
+
+    def _reset_candidate(self):
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._parts = []
+
+    def feed(self, chunk):
+        """Consumes the next chunk. Returns the first complete JSON object once it has closed, else None."""
+        if self.result is not None or not chunk:
+            return self.result
+
+        pos = 0
+        # Start of the current candidate inside this chunk (None if it started in an earlier chunk)
+        start = 0 if self._depth else None
+
+        if self._escape:
+            # Previous chunk ended with a backslash inside a string
+            self._escape = False
+            pos = 1
+
+        while True:
+            match = _SPECIAL_CHARS.search(chunk, pos)
+            if match is None:
+                break
+            i = match.start()
+            char = chunk[i]
+            pos = i + 1
+
+            if self._depth == 0:
+                # Outside any object only an opening brace matters
+                if char == "{":
+                    self._depth = 1
+                    start = i
+                continue
+
+            if self._in_string:
+                if char == "\\":
+                    if pos >= len(chunk):
+                        self._escape = True
+                    pos += 1
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._parts.append(chunk[start:pos] if start is not None else chunk[:pos])
+                    candidate = "".join(self._parts)
+                    self._reset_candidate()
+                    start = None
+                    try:
+                        self.result = json.loads(candidate)
+                        return self.result
+                    except json.JSONDecodeError:
+                        continue
+
+        if self._depth:
+            self._parts.append(chunk[start:] if start is not None else chunk)
+        return None
 
 def extract_json(text):
     """
     Extracts JSON object from a string.
-    Handles markdown code blocks and raw JSON strings.
+    Handles markdown code blocks, raw JSON strings and JSON embedded in prose
+    with a single linear scan (see JSONStreamExtractor).
     """
-    try:
-        # First try to parse as is
-        return json.loads(text)
-    except json.JSONDecodeError:
-        pass
-
-    # Look for markdown code blocks
-    pattern = r"```(?:json)?\s*(\{.*?\})\s*```"
-    match = re.search(pattern, text, re.DOTALL)
-    if match:
-        try:
-            return json.loads(match.group(1))
-        except json.JSONDecodeError:
-            pass
-            
-    # Look for raw JSON object structure
-    pattern = r"(\{.*\})"
-    match = re.search(pattern, text, re.DOTALL)
-    if match:
-        try:
-            return json.loads(match.group(1))
-        except json.JSONDecodeError:
-            pass
-            
-    return None
+    if not isinstance(text, str):
+        return None
+    with metrics.timer("json_extract_seconds"):
+        return JSONStreamExtractor().feed(text)
 
 def format_prompt_for_display(json_data):
     """
@@ -0,0 +1,232 @@
+import collections
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utils.concurrency import is_error_response
+from utils.context_packing import estimate_tokens
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class RollingHistogram:
+    """
+    Keeps the last `window` observations for p50/p95/p99, plus lifetime count and sum
+    (the Prometheus summary convention: quantiles are recent, _count/_sum are cumulative).
+    """
+
+    def __init__(self, window=1024):
+        self._samples = collections.deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self._samples.append(value)
+        self.count += 1
+        self.sum += value
+
+    def quantiles(self, qs=QUANTILES):
+        ordered = sorted(self._samples)
+        if not ordered:
+            return {q: None for q in qs}
+        return {q: ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] for q in qs}
+
+
+class MetricsRegistry:
+    """
+    Thread-safe in-process metrics: rolling histograms (timers, sizes) and counters, keyed by
+    metric name + labels. Exported as Prometheus text (to_prometheus / write_prometheus /
+    start_metrics_server) or as rows for the Performance tab (snapshot).
+    """
+
+    def __init__(self, window=1024):
+        self.window = window
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = RollingHistogram(self.window)
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Span: observes the block's wall time in seconds under `name` (also when it raises)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name, **labels):
+        """Decorator form of timer() for plain functions."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        """Rows for display: one dict per histogram (count, sum, p50/p95/p99) and per counter."""
+        with self._lock:
+            histograms = [(key, h.count, h.sum, h.quantiles()) for key, h in self._histograms.items()]
+            counters = list(self._counters.items())
+        rows = []
+        for (name, labels), count, total, quantiles in sorted(histograms):
+            rows.append({
+                "metric": name,
+                "labels": ",".join(f"{k}={v}" for k, v in labels),
+                "count": count,
+                "sum": total,
+                "p50": quantiles[0.5],
+                "p95": quantiles[0.95],
+                "p99": quantiles[0.99]
+            })
+        for (name, labels), value in sorted(counters):
+            rows.append({"metric": name, "labels": ",".join(f"{k}={v}" for k, v in labels), "count": value})
+        return rows
+
+    def to_prometheus(self):
+        """Prometheus text exposition format (histograms as summaries)."""
+        def fmt_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in pairs) + "}"
+
+        with self._lock:
+            histograms = [(key, h.count, h.sum, h.quantiles()) for key, h in self._histograms.items()]
+            counters = list(self._counters.items())
+
+        lines = []
+        typed = set()
+        for (name, labels), count, total, quantiles in sorted(histograms):
+            if name not in typed:
+                lines.append(f"# TYPE {name} summary")
+                typed.add(name)
+            for q, value in quantiles.items():
+                if value is not None:
+                    lines.append(f"{name}{fmt_labels(labels, [('quantile', q)])} {value}")
+            lines.append(f"{name}_count{fmt_labels(labels)} {count}")
+            lines.append(f"{name}_sum{fmt_labels(labels)} {total}")
+        for (name, labels), value in sorted(counters):
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{fmt_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Writes the Prometheus text atomically (e.g. for node_exporter's textfile collector)."""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Process-wide registry used by the RAG manager, engines and pipeline
+metrics = MetricsRegistry()
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=9108, host="127.0.0.1", registry=None):
+    """
+    Serves GET /metrics (Prometheus text) from a daemon thread. Idempotent: the first call
+    starts the server, later calls return it.
+    """
+    global _server
+    registry = registry or metrics
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+            print(f"Metrics endpoint: http://{host}:{_server.server_address[1]}/metrics")
+        return _server
+
+
+class LLMCall:
+    """
+    Metrics span for one provider API call. Engines open it only after a response-cache miss,
+    so cached answers never count as LLM latency (they are counted in llm_cache_hits_total).
+    Records latency, time to first chunk for streams, and request/response bytes and estimated
+    tokens (chars/4) per call, labelled with the model and call mode.
+
+    Args:
+        model (str): Model id (engine.model).
+        mode (str): Label value, e.g. "sync", "stream", "async", "async_stream".
+        request_text (str): Text actually sent: the prompt, or the joined message contents.
+    """
+
+    def __init__(self, model, mode, request_text):
+        self.labels = {"model": model, "mode": mode}
+        self.request_text = request_text
+        self.start = time.perf_counter()
+        self._first_chunk_seen = False
+
+    @staticmethod
+    def cache_hit(model, mode):
+        metrics.inc("llm_cache_hits_total", model=model, mode=mode)
+
+    def chunk(self):
+        """Call for every streamed chunk; the first one records time to first chunk."""
+        if not self._first_chunk_seen:
+            self._first_chunk_seen = True
+            metrics.observe("llm_first_chunk_seconds", time.perf_counter() - self.start, **self.labels)
+
+    def finish(self, response):
+        """Call once with the full response text (or the engine's error string)."""
+        metrics.observe("llm_request_seconds", time.perf_counter() - self.start, **self.labels)
+        if self.request_text is not None:
+            metrics.observe("llm_prompt_bytes", len(self.request_text.encode("utf-8")), **self.labels)
+            metrics.observe("llm_prompt_tokens_estimate", estimate_tokens(self.request_text), **self.labels)
+        if response:
+            metrics.observe("llm_response_bytes", len(response.encode("utf-8")), **self.labels)
+            metrics.observe("llm_response_tokens_estimate", estimate_tokens(response), **self.labels)
+        if is_error_response(response):
+            metrics.inc("llm_errors_total", **self.labels)
@@ -0,0 +1,21 @@
+import json
+import os
+import threading
+
+_lock = threading.Lock()
+
+
+def record_response(model, user_input, response):
+    """
+    Appends a real LLM response to the JSONL file named by LLM_RECORD_PATH (no-op if unset).
+    The file can be replayed by benchmarks/mock_llm_server.py for offline load tests.
+    """
+    path = os.getenv("LLM_RECORD_PATH")
+    if not path or not response:
+        return
+    line = json.dumps({"model": model, "input": user_input, "response": response}, ensure_ascii=False)
+    with _lock:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")